@@ -0,0 +1,74 @@
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, date, time as day_time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from db import models
+from features.form.form_controller import AllFormsResponse, all_forms_serializer
+
+"""
+Serialization benchmark - time to turn a page of forms (ORM objects, as loaded by list_forms) into a JSON body.
+No database needed. Usage: python -m benchmarks.serialize_forms [form count] [rounds]
+"""
+
+
+def build_forms(count: int) -> list[models.Form]:
+    now = datetime.now()
+    reason = models.FormReason(id=1, name="Nghỉ phép năm", description="Không giới hạn",
+                               productivity=models.FormProductivity.productivity.name,
+                               form_type=models.FormType.leave_request.name)
+    users = [models.UserAccount(id=i, username=f"user{i}", department="IT Department", role="developer",
+                                line_manager="manager", firstname="Nguyễn", middlename="Văn", lastname=f"User {i}",
+                                gender="male", email=f"user{i}@example.com", status=models.UserType.active,
+                                identity=f"0790{i:08d}", identity_type=models.IdentityType.cccd,
+                                enable_2_verification=False, created=now, last_updated=now)
+             for i in range(50)]
+    return [models.Form(id=i, form_status=models.FormStatus.pending, form_phase=models.FormPhase.director_approved,
+                        form_type=models.FormType.leave_request, reason=1, form_reason=reason,
+                        productivity=models.FormProductivity.productivity, department="IT Department",
+                        role="developer", created_user_obj=users[i % 50], assigned_user_obj=users[(i + 1) % 50],
+                        created_user=users[i % 50].username, assigned_user=users[(i + 1) % 50].username,
+                        description="nghỉ phép", note="note", created=now, last_updated=now,
+                        details=[models.FormDetail(id=i * 2 + d, form=i, from_time=day_time(8), to_time=day_time(17),
+                                                   from_date=date(2026, 10, 1 + d), to_date=date(2026, 10, 1 + d))
+                                 for d in range(2)])
+            for i in range(count)]
+
+
+def fastapi_default(field, content, response_class) -> bytes:
+    """ What a route returning the dict does: validate, serialize to python, then render the body """
+    value = asyncio.run(serialize_response(field=field, response_content=content, is_coroutine=True))
+    return response_class(value).body
+
+
+def measure(serialize, rounds: int, count: int) -> float:
+    """ Median milliseconds per 1,000 forms """
+    serialize()  # warm up
+    timings = []
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        serialize()
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings) * 1000 * 1000 / count
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    content = {"total_count": count, "data": build_forms(count), "next_cursor": None}
+    field = create_response_field(name="response", type_=AllFormsResponse, mode="serialization")
+
+    assert (len(fastapi_default(field, content, JSONResponse)) == len(fastapi_default(field, content, ORJSONResponse))
+            == len(all_forms_serializer.dump(content)))
+    baseline = None
+    for name, serialize in (("FastAPI + JSONResponse (before)", lambda: fastapi_default(field, content, JSONResponse)),
+                            ("FastAPI + ORJSONResponse", lambda: fastapi_default(field, content, ORJSONResponse)),
+                            ("JsonSerializer", lambda: all_forms_serializer.dump(content))):
+        per_thousand = measure(serialize, rounds, count)
+        baseline = baseline or per_thousand
+        print(f"{name:<35} {per_thousand:8.2f} ms per 1,000 forms  x{baseline / per_thousand:.2f}")
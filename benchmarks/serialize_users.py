@@ -0,0 +1,66 @@
+import enum
+import statistics
+import sys
+import time
+from datetime import datetime, date, time as day_time
+
+from db import models
+
+"""
+as_dict benchmark - the per-model serializer against the previous __dict__ walk, on users loaded
+the way a query loads them. No database needed. Usage: python -m benchmarks.serialize_users [user count] [rounds]
+"""
+
+
+def walk_as_dict(instance) -> dict:
+    """ The previous Base.as_dict """
+    result = {}
+    for attr, value in instance.__dict__.items():
+        if not attr.startswith('_'):
+            if isinstance(value, enum.Enum):
+                result[attr] = value.value
+            elif isinstance(value, datetime):
+                result[attr] = value.isoformat()
+            elif isinstance(value, date):
+                result[attr] = value.strftime("%Y-%m-%d")
+            elif isinstance(value, day_time):
+                result[attr] = value.strftime("%H:%M:%S")
+            elif isinstance(value, models.Base):
+                result[attr] = walk_as_dict(value)
+            else:
+                result[attr] = value
+    return result
+
+
+def build_users(count: int) -> list[models.UserAccount]:
+    now = datetime.now()
+    return [models.UserAccount(id=i, username=f"user{i}", password="$2b$12$" + "x" * 53, department="IT Department",
+                               role="developer", line_manager="manager", firstname="Nguyễn", middlename="Văn",
+                               lastname=f"User {i}", gender="male", email=f"user{i}@example.com",
+                               status=models.UserType.active, identity=f"0790{i:08d}",
+                               identity_type=models.IdentityType.cccd, enable_2_verification=False,
+                               created=now, last_updated=now)
+            for i in range(count)]
+
+
+def measure(serialize, users: list, rounds: int) -> float:
+    """ Median milliseconds for the whole list """
+    timings = []
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        for user in users:
+            serialize(user)
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings) * 1000
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    users = build_users(count)
+    assert all(walk_as_dict(user) == user.as_dict() for user in users)
+
+    baseline = measure(walk_as_dict, users, rounds)
+    per_model = measure(models.UserAccount.as_dict, users, rounds)
+    print(f"{'__dict__ walk (before)':<25} {baseline:8.2f} ms per {count:,} users")
+    print(f"{'per-model serializer':<25} {per_model:8.2f} ms per {count:,} users  x{baseline / per_model:.2f}")
@@ -1,10 +1,15 @@
+import hashlib
+import itertools
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, event, text
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker, Session
 
-from db import models
+from db import pool
+from utils.ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -17,74 +22,81 @@ db_name = os.getenv('DB_PORTGRES_DBNAME')
 
 # Construct the database URL
 SQLALCHEMY_DATABASE_URL = f"postgresql://{db_username}:{db_password}@{db_host}:{db_port}/{db_name}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{db_username}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# sync engine - schema management and scripts only
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool.engine_options(is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+class PrimarySession(Session):
+    """ Session on the primary, remembers in info["wrote"] whether it sent any INSERT / UPDATE / DELETE """
+
+
+# callers that wrote recently read from the primary, so they see their own writes despite replication lag
+read_your_writes_seconds = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+recent_writers = TTLCache(max_size=int(os.getenv("DB_READ_YOUR_WRITES_CACHE_SIZE", 10000)),
+                          ttl=read_your_writes_seconds)
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def remember_writer(session):
+    if session.info.pop("wrote", False) and session.info.get("caller") is not None:
+        recent_writers.set(session.info["caller"], True)
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def forget_rolled_back_write(session):
+    session.info.pop("wrote", None)
+
+
+# async engine - used by all request handlers
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **pool.engine_options(is_async=True))
+# objects stay readable after commit, an async session can not lazy load expired attributes
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False,
+                                       sync_session_class=PrimarySession)
+
+# read replicas - DB_REPLICA_HOSTS is a comma separated list of host[:port], same credentials and database
+replica_hosts = [host.strip() for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+replica_engines = [create_async_engine(f"postgresql+asyncpg://{db_username}:{db_password}@"
+                                       f"{host if ':' in host else f'{host}:{db_port}'}/{db_name}",
+                                       **pool.engine_options(is_async=True))
+                   for host in replica_hosts]
+replica_sessions = itertools.cycle([async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+                                    for replica_engine in replica_engines])
+
+
+def caller_key(request: Request) -> str | None:
+    """ The caller is identified by its auth token, hashed so tokens are not kept in memory """
+    authorization = request.headers.get("Authorization")
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest() if authorization else None
+
+
+async def get_db(request: Request):
+    async with AsyncSessionLocal(info={"caller": caller_key(request)}) as db:
         yield db
-    finally:
-        db.close()
-
-
-@event.listens_for(models.Department.__table__, "after_create")
-def init_department(target, connection, **kw):
-    """ Init data the permission table. """
-    connection.execute(text(
-        f"INSERT INTO {target.name} (name, description, created, last_updated) VALUES "
-        f"('IT Department', 'Department for all IT staffs', now(), now()); "
-    ))
-
-
-@event.listens_for(models.Permission.__table__, "after_create")
-def init_permission(target, connection, **kw):
-    """ Init data the permission table. """
-    connection.execute(text(
-        f"INSERT INTO {target.name} (id, name, description, created) VALUES "
-        f"('READ', 'Read', 'Read permission', now()), "
-        f"('WRITE', 'Write', 'Write permission', now());"
-    ))
-
-
-@event.listens_for(models.Role.__table__, "after_create")
-def init_role(target, connection, **kw):
-    """ Init data the permission table. """
-    connection.execute(text(
-        f"INSERT INTO {target.name} (name, description, created, last_updated) VALUES "
-        f"('developer', '', now(), now()), "
-        f"('test', '', now(), now());"
-    ))
-
-
-@event.listens_for(models.RolePermission.__table__, "after_create")
-def init_role_permission(target, connection, **kw):
-    """ Init data the permission table. """
-    connection.execute(text(
-        f"INSERT INTO {target.name} (role, permission) VALUES "
-        f"('developer', 'READ'), "
-        f"('developer', 'WRITE'), "
-        f"('test', 'READ');"
-    ))
-
-
-@event.listens_for(models.FormReason.__table__, "after_create")
-def init_form_reason(target, connection, **kw):
-    """ Init data the form_reason table. """
-    connection.execute(text(
-        f"INSERT INTO {target.name} (name, description, productivity, form_type) VALUES "
-        f"('Nghỉ phép năm', 'Không giới hạn', '{models.FormProductivity.productivity.name}', '{models.FormType.leave_request.name}'), "
-        f"('Nghỉ ốm đau (BHXH)', 'Không giới hạn', '{models.FormProductivity.no_productivity.name}', '{models.FormType.leave_request.name}'), "
-        f"('Nghỉ kết hôn', 'Không giới hạn', '{models.FormProductivity.productivity.name}', '{models.FormType.leave_request.name}'), "
-        f"('Nghỉ vợ sinh (BHXH)', 'Không giới hạn', '{models.FormProductivity.no_productivity.name}', '{models.FormType.leave_request.name}'), "
-        f"('Nghỉ không lương', 'Không giới hạn', '{models.FormProductivity.no_productivity.name}', '{models.FormType.leave_request.name}'), "
-
-        f"('Việc cá nhân (không tính công)', 'Không giới hạn', '{models.FormProductivity.no_productivity.name}', '{models.FormType.absentee.name}'), "
-        f"('Giải quyết việc Công ty', 'Không giới hạn', '{models.FormProductivity.productivity.name}', '{models.FormType.absentee.name}'), "
-        f"('Làm việc tại nhà (WFH)', 'Không giới hạn', '{models.FormProductivity.productivity.name}', '{models.FormType.absentee.name}'), "
-        f"('Tham gia khóa đào tạo bên ngoài', 'Không giới hạn', '{models.FormProductivity.productivity.name}', '{models.FormType.absentee.name}'), "
-        f"('Nghỉ bù ngày lễ', 'Không giới hạn<break>Khi ngày lễ trùng ngày nghỉ hàng tuần', '{models.FormProductivity.productivity.name}', '{models.FormType.absentee.name}'), "
-        f"('Tham gia sự kiện của Công ty ở bên ngoài', 'Không giới hạn', '{models.FormProductivity.no_productivity.name}', '{models.FormType.absentee.name}');"
-    ))
+
+
+def read_session(request: Request) -> AsyncSession:
+    """ Session for reads: a replica, or the primary without replicas or right after the caller wrote """
+    key = caller_key(request)
+    if not replica_engines or (key is not None and recent_writers.get(key)):
+        return AsyncSessionLocal(info={"caller": key})
+    return next(replica_sessions)()
+
+
+async def get_read_db(request: Request):
+    async with read_session(request) as db:
+        yield db
+
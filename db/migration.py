@@ -0,0 +1,103 @@
+import importlib
+import pkgutil
+import sys
+from types import ModuleType
+
+from sqlalchemy import Connection, Engine, text
+
+from db.database import engine
+
+"""
+Schema migrations - versioned scripts in db/migrations, applied in order and recorded in schema_version.
+
+A script is named m<version>_<name>.py and defines upgrade(connection). Scripts with
+transactional = False run in autocommit mode, needed by CREATE INDEX CONCURRENTLY.
+Scripts hold their statements as literals, never imported from the application, so an applied script
+keeps meaning what it did when it ran and a fresh database ends up like an upgraded one.
+Scripts should be idempotent (IF NOT EXISTS ...), a non-transactional one can be interrupted halfway.
+
+Usage: python -m db.migration [upgrade|status]
+"""
+
+# any constant, identifies the advisory lock serializing concurrent migration runs
+MIGRATION_LOCK_ID = 7_246_001
+
+
+def load_migrations() -> list[ModuleType]:
+    package = importlib.import_module("db.migrations")
+    migrations = [importlib.import_module(f"db.migrations.{module.name}")
+                  for module in pkgutil.iter_modules(package.__path__) if module.name.startswith("m")]
+    return sorted(migrations, key=version_of)
+
+
+def version_of(migration: ModuleType) -> int:
+    return int(migration.__name__.rsplit(".", 1)[-1][1:].split("_", 1)[0])
+
+
+def applied_versions(connection: Connection) -> set[int]:
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+    ))
+    return set(connection.execute(text("SELECT version FROM schema_version")).scalars())
+
+
+def create_index_concurrently(connection: Connection, name: str, table: str, definition: str):
+    """ Build an index without blocking writes, replacing an invalid leftover of an interrupted build """
+    is_valid = connection.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name}).scalar()
+    if is_valid is False:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def upgrade(bind: Engine = engine) -> list[str]:
+    applied = []
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        lock_connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            done = applied_versions(lock_connection)
+            for migration in load_migrations():
+                version = version_of(migration)
+                if version in done:
+                    continue
+
+                name = migration.__name__.rsplit(".", 1)[-1]
+                if getattr(migration, "transactional", True):
+                    with bind.begin() as connection:
+                        migration.upgrade(connection)
+                        record_version(connection, version, name)
+                else:
+                    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                        migration.upgrade(connection)
+                        record_version(connection, version, name)
+                applied.append(name)
+                print(f"migration: applied {name}")
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+    return applied
+
+
+def record_version(connection: Connection, version: int, name: str):
+    connection.execute(text("INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+                       {"version": version, "name": name})
+
+
+def status(bind: Engine = engine) -> list[tuple[str, bool]]:
+    with bind.begin() as connection:
+        done = applied_versions(connection)
+    return [(migration.__name__.rsplit(".", 1)[-1], version_of(migration) in done) for migration in load_migrations()]
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        if not upgrade():
+            print("migration: schema is up to date")
+    elif command == "status":
+        for migration_name, is_applied in status():
+            print(f"{'applied' if is_applied else 'pending'}  {migration_name}")
+    else:
+        print(f"unknown command {command}, expected upgrade or status")
+        sys.exit(1)
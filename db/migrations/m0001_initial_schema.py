@@ -0,0 +1,210 @@
+from sqlalchemy import Connection, text
+
+"""
+Tables that used to be created by create_all on application start, with the rows its after_create hooks seeded.
+The statements are frozen as they were when this script was written, later model changes come with scripts
+of their own. A database created by the application before migrations existed already has them all.
+"""
+
+statements = [
+    "CREATE TYPE user_type AS ENUM ('active', 'suspend', 'deleted')",
+    "CREATE TYPE identity_type AS ENUM ('cccd', 'cmnd', 'hc')",
+    "CREATE TYPE active_user_type AS ENUM ('pending', 'active', 'expired', 'cancelled')",
+    "CREATE TYPE form_status AS ENUM ('pending', 'approved', 'cancelled')",
+    "CREATE TYPE form_phase AS ENUM ('director_approved', 'authorized_person_approved', 'direct_manager_approved')",
+    "CREATE TYPE form_type AS ENUM ('leave_request', 'absentee', 'job_overtime', 'check_in_out', 'shift_change', "
+    "'shift_overtime', 'shift_registration', 'business_trip_request', 'work_mode_request', 'resignation')",
+    "CREATE TYPE formproductivity AS ENUM ('no_productivity', 'productivity', 'half_productivity')",
+    """
+    CREATE TABLE department (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_department_name ON department (name)",
+    """
+    CREATE TABLE role (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_role_name ON role (name)",
+    """
+    CREATE TABLE permission (
+        id VARCHAR NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_permission_name ON permission (name)",
+    """
+    CREATE TABLE form_reason (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        productivity VARCHAR,
+        form_type VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE role_permission (
+        id SERIAL NOT NULL,
+        role VARCHAR NOT NULL,
+        permission VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (role) REFERENCES role (name) ON DELETE CASCADE ON UPDATE CASCADE,
+        FOREIGN KEY (permission) REFERENCES permission (id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE user_account (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        password VARCHAR NOT NULL,
+        department VARCHAR,
+        role VARCHAR,
+        line_manager VARCHAR,
+        firstname VARCHAR NOT NULL,
+        middlename VARCHAR,
+        lastname VARCHAR NOT NULL,
+        gender VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        status user_type NOT NULL,
+        identity VARCHAR NOT NULL,
+        identity_type identity_type NOT NULL,
+        enable_2_verification BOOLEAN NOT NULL,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (department) REFERENCES department (name),
+        FOREIGN KEY (role) REFERENCES role (name)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_user_account_identity ON user_account (identity)",
+    "CREATE UNIQUE INDEX ix_user_account_username ON user_account (username)",
+    "CREATE UNIQUE INDEX ix_user_account_email ON user_account (email)",
+    """
+    CREATE TABLE active_user (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        otp INTEGER NOT NULL,
+        status active_user_type NOT NULL,
+        expired_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        attempts INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (username) REFERENCES user_account (username) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE user_image (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        image VARCHAR NOT NULL,
+        image_type VARCHAR,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (username) REFERENCES user_account (username) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE user_token (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        token VARCHAR NOT NULL,
+        expired_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (username) REFERENCES user_account (username) ON DELETE CASCADE ON UPDATE CASCADE,
+        UNIQUE (token)
+    )
+    """,
+    """
+    CREATE TABLE form (
+        id SERIAL NOT NULL,
+        form_status form_status NOT NULL,
+        form_phase form_phase NOT NULL,
+        form_type form_type NOT NULL,
+        reason INTEGER NOT NULL,
+        productivity formproductivity NOT NULL,
+        department VARCHAR NOT NULL,
+        role VARCHAR NOT NULL,
+        created_user VARCHAR NOT NULL,
+        assigned_user VARCHAR NOT NULL,
+        description VARCHAR,
+        note VARCHAR,
+        created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (reason) REFERENCES form_reason (id) ON UPDATE CASCADE,
+        FOREIGN KEY (department) REFERENCES department (name) ON UPDATE CASCADE,
+        FOREIGN KEY (role) REFERENCES role (name) ON UPDATE CASCADE,
+        FOREIGN KEY (created_user) REFERENCES user_account (username) ON UPDATE CASCADE,
+        FOREIGN KEY (assigned_user) REFERENCES user_account (username) ON UPDATE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE form_detail (
+        id SERIAL NOT NULL,
+        form INTEGER NOT NULL,
+        from_time TIME WITHOUT TIME ZONE NOT NULL,
+        to_time TIME WITHOUT TIME ZONE NOT NULL,
+        from_date DATE NOT NULL,
+        to_date DATE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (form) REFERENCES form (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    INSERT INTO department (name, description, created, last_updated) VALUES
+        ('IT Department', 'Department for all IT staffs', now(), now())
+    """,
+    """
+    INSERT INTO permission (id, name, description, created) VALUES
+        ('READ', 'Read', 'Read permission', now()),
+        ('WRITE', 'Write', 'Write permission', now())
+    """,
+    """
+    INSERT INTO role (name, description, created, last_updated) VALUES
+        ('developer', '', now(), now()),
+        ('test', '', now(), now())
+    """,
+    """
+    INSERT INTO role_permission (role, permission) VALUES
+        ('developer', 'READ'),
+        ('developer', 'WRITE'),
+        ('test', 'READ')
+    """,
+    """
+    INSERT INTO form_reason (name, description, productivity, form_type) VALUES
+        ('Nghỉ phép năm', 'Không giới hạn', 'productivity', 'leave_request'),
+        ('Nghỉ ốm đau (BHXH)', 'Không giới hạn', 'no_productivity', 'leave_request'),
+        ('Nghỉ kết hôn', 'Không giới hạn', 'productivity', 'leave_request'),
+        ('Nghỉ vợ sinh (BHXH)', 'Không giới hạn', 'no_productivity', 'leave_request'),
+        ('Nghỉ không lương', 'Không giới hạn', 'no_productivity', 'leave_request'),
+        ('Việc cá nhân (không tính công)', 'Không giới hạn', 'no_productivity', 'absentee'),
+        ('Giải quyết việc Công ty', 'Không giới hạn', 'productivity', 'absentee'),
+        ('Làm việc tại nhà (WFH)', 'Không giới hạn', 'productivity', 'absentee'),
+        ('Tham gia khóa đào tạo bên ngoài', 'Không giới hạn', 'productivity', 'absentee'),
+        ('Nghỉ bù ngày lễ', 'Không giới hạn<break>Khi ngày lễ trùng ngày nghỉ hàng tuần', 'productivity', 'absentee'),
+        ('Tham gia sự kiện của Công ty ở bên ngoài', 'Không giới hạn', 'no_productivity', 'absentee')
+    """,
+]
+
+
+def upgrade(connection: Connection):
+    if connection.execute(text("SELECT to_regclass('form_detail')")).scalar() is not None:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
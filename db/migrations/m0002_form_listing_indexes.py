@@ -0,0 +1,18 @@
+from sqlalchemy import Connection
+
+from db.migration import create_index_concurrently
+
+""" Indexes serving the form listings and counts, ordered like the listings: newest first """
+
+transactional = False
+
+
+def upgrade(connection: Connection):
+    create_index_concurrently(connection, "ix_form_created_user_status_created", "form",
+                              "(created_user, form_status, created, id)")
+    create_index_concurrently(connection, "ix_form_assigned_user_status_created", "form",
+                              "(assigned_user, form_status, created, id)")
+    create_index_concurrently(connection, "ix_form_department_status_created", "form",
+                              "(department, form_status, created, id)")
+    create_index_concurrently(connection, "ix_form_status_created", "form", "(form_status, created, id)")
+    create_index_concurrently(connection, "ix_form_created", "form", "(created, id)")
@@ -0,0 +1,27 @@
+from sqlalchemy import Connection, text
+
+""" Form counters table, filled from the existing forms """
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS form_counter (
+            scope VARCHAR NOT NULL,
+            owner VARCHAR NOT NULL,
+            form_status VARCHAR NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (scope, owner, form_status)
+        )
+    """))
+    connection.execute(text("""
+        INSERT INTO form_counter (scope, owner, form_status, count)
+        SELECT 'created_user' AS scope, created_user AS owner, form_status::text AS form_status, count(*) AS count
+        FROM form GROUP BY created_user, form_status
+        UNION ALL
+        SELECT 'assigned_user', assigned_user, form_status::text, count(*) FROM form GROUP BY assigned_user, form_status
+        UNION ALL
+        SELECT 'department', department, form_status::text, count(*) FROM form GROUP BY department, form_status
+        UNION ALL
+        SELECT 'all', '', form_status::text, count(*) FROM form GROUP BY form_status
+        ON CONFLICT DO NOTHING
+    """))
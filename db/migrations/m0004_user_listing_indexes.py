@@ -0,0 +1,13 @@
+from sqlalchemy import Connection
+
+from db.migration import create_index_concurrently
+
+""" Indexes serving the /users listing: firstname descending (a backward scan), id breaking ties """
+
+transactional = False
+
+
+def upgrade(connection: Connection):
+    create_index_concurrently(connection, "ix_user_account_firstname_id", "user_account", "(firstname, id)")
+    create_index_concurrently(connection, "ix_user_account_department_firstname_id", "user_account",
+                              "(department, firstname, id)")
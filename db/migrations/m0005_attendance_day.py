@@ -0,0 +1,42 @@
+from sqlalchemy import Connection, text
+
+""" Attendance fact table, filled from the existing forms """
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS attendance_day (
+            form INTEGER NOT NULL,
+            day DATE NOT NULL,
+            username VARCHAR NOT NULL,
+            department VARCHAR NOT NULL,
+            reason INTEGER NOT NULL,
+            form_type VARCHAR NOT NULL,
+            form_status VARCHAR NOT NULL,
+            productivity VARCHAR NOT NULL,
+            hours NUMERIC(8, 2) NOT NULL,
+            productive_hours NUMERIC(8, 2) NOT NULL,
+            PRIMARY KEY (form, day),
+            FOREIGN KEY (form) REFERENCES form (id) ON DELETE CASCADE
+        )
+    """))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_day_day_department ON attendance_day (day, department)"))
+    connection.execute(text("DELETE FROM attendance_day"))
+    connection.execute(text("""
+        INSERT INTO attendance_day (form, day, username, department, reason, form_type, form_status, productivity,
+                                    hours, productive_hours)
+        SELECT f.id, d.day::date, f.created_user, f.department, f.reason, f.form_type::text, f.form_status::text,
+               f.productivity::text, round(sum(d.hours), 2),
+               round(sum(d.hours) * CASE f.productivity::text
+                   WHEN 'productivity' THEN 1 WHEN 'half_productivity' THEN 0.5 WHEN 'no_productivity' THEN 0
+                   ELSE 0 END, 2)
+        FROM form f
+        JOIN LATERAL (
+            SELECT day, (extract(epoch FROM fd.to_time - fd.from_time)
+                         + CASE WHEN fd.to_time < fd.from_time THEN 86400 ELSE 0 END) / 3600 AS hours
+            FROM form_detail fd, generate_series(fd.from_date, fd.to_date, interval '1 day') AS day
+            WHERE fd.form = f.id
+        ) d ON true
+        GROUP BY f.id, d.day
+    """))
@@ -0,0 +1,30 @@
+from sqlalchemy import Connection, text
+
+from db.migration import create_index_concurrently
+
+"""
+Overlap checks of form details: the created_user of the form copied onto its details and a GiST index over
+(username, period). btree_gist provides the GiST operator class of the username equality.
+
+The not null check is added NOT VALID before the backfill, so no detail written meanwhile is left without
+a username, and validated without blocking writes. SET NOT NULL then relies on it instead of a table scan.
+"""
+
+transactional = False
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    connection.execute(text("ALTER TABLE form_detail ADD COLUMN IF NOT EXISTS username VARCHAR "
+                            "REFERENCES user_account (username) ON UPDATE CASCADE"))
+    connection.execute(text("ALTER TABLE form_detail DROP CONSTRAINT IF EXISTS form_detail_username_not_null"))
+    connection.execute(text("ALTER TABLE form_detail ADD CONSTRAINT form_detail_username_not_null "
+                            "CHECK (username IS NOT NULL) NOT VALID"))
+    connection.execute(text("UPDATE form_detail d SET username = f.created_user FROM form f "
+                            "WHERE f.id = d.form AND d.username IS NULL"))
+    connection.execute(text("ALTER TABLE form_detail VALIDATE CONSTRAINT form_detail_username_not_null"))
+    connection.execute(text("ALTER TABLE form_detail ALTER COLUMN username SET NOT NULL"))
+    connection.execute(text("ALTER TABLE form_detail DROP CONSTRAINT form_detail_username_not_null"))
+    create_index_concurrently(connection, "ix_form_detail_username_period", "form_detail",
+                              "USING gist (username, (tsrange(from_date + from_time, to_date + to_time "
+                              "+ CASE WHEN to_time < from_time THEN interval '1 day' ELSE interval '0' END)))")
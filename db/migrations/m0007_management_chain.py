@@ -0,0 +1,32 @@
+from sqlalchemy import Connection, text
+
+""" Management hierarchy closure table, filled from user_account.line_manager """
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS management_chain (
+            manager VARCHAR NOT NULL,
+            member VARCHAR NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (manager, member),
+            FOREIGN KEY (manager) REFERENCES user_account (username) ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY (member) REFERENCES user_account (username) ON DELETE CASCADE ON UPDATE CASCADE
+        )
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_management_chain_member ON management_chain (member)"))
+    connection.execute(text("DELETE FROM management_chain"))
+    # a chain stops at a user it already passed or at an unknown manager
+    connection.execute(text("""
+        WITH RECURSIVE chain (manager, member, depth, path) AS (
+            SELECT username, username, 0, ARRAY[username] FROM user_account
+            UNION ALL
+            SELECT above.username, chain.member, chain.depth + 1, chain.path || above.username
+            FROM chain
+            JOIN user_account below ON below.username = chain.manager
+            JOIN user_account above ON above.username = below.line_manager
+            WHERE above.username <> ALL(chain.path)
+        )
+        INSERT INTO management_chain (manager, member, depth)
+        SELECT manager, member, min(depth) FROM chain GROUP BY manager, member
+    """))
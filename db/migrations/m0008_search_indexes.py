@@ -0,0 +1,26 @@
+from sqlalchemy import Connection, text
+
+from db.migration import create_index_concurrently
+
+"""
+Search indexes: full text over form description and note, trigrams over user names, username and email.
+unaccent is only stable (its dictionary can change), an index needs an immutable function, so it is wrapped
+in immutable_unaccent with the dictionary named explicitly.
+"""
+
+transactional = False
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text(
+        "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"))
+    create_index_concurrently(connection, "ix_form_search", "form",
+                              "USING gin ((to_tsvector('simple'::regconfig, immutable_unaccent("
+                              "coalesce(description, '') || ' ' || coalesce(note, '')))))")
+    create_index_concurrently(connection, "ix_user_account_search", "user_account",
+                              "USING gin ((lower(immutable_unaccent(firstname || ' ' || coalesce(middlename, '') "
+                              "|| ' ' || lastname || ' ' || username || ' ' || email))) gin_trgm_ops)")
@@ -0,0 +1,17 @@
+from sqlalchemy import Connection, text
+
+""" Revoked tokens table of the stateless token validation """
+
+
+def upgrade(connection: Connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS revoked_token (
+            id VARCHAR NOT NULL,
+            username VARCHAR NOT NULL,
+            expired_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id)
+        )
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_revoked_token_username ON revoked_token (username)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_revoked_token_expired_at ON revoked_token (expired_at)"))
@@ -1,8 +1,9 @@
 import enum
 from datetime import datetime, date, time
-from typing import Optional, List
+from operator import itemgetter
+from typing import Optional, List, Callable
 
-from sqlalchemy import Integer, DateTime, Enum, ForeignKey, Time, Date, Boolean
+from sqlalchemy import Integer, DateTime, Enum, ForeignKey, Time, Date, Boolean, Index, Numeric, inspect
 from sqlalchemy import String
 from sqlalchemy.orm import DeclarativeBase, relationship, mapped_column, Mapped
 
@@ -10,26 +11,99 @@ from sqlalchemy.orm import DeclarativeBase, relationship, mapped_column, Mapped
 class Base(DeclarativeBase):
     def as_dict(self):
         """ convert model to json """
-        result = {}
-        for attr, value in self.__dict__.items():
-            if not attr.startswith('_'):
-                if isinstance(value, enum.Enum):
-                    result[attr] = value.value
-                elif isinstance(value, datetime):
-                    result[attr] = value.isoformat()
-                elif isinstance(value, date):
-                    result[attr] = value.strftime("%Y-%m-%d")
-                elif isinstance(value, time):
-                    result[attr] = value.strftime("%H:%M:%S")
-                elif isinstance(value, Base):
-                    result[attr] = value.as_dict()
-                else:
-                    result[attr] = value
-        return result
+        return serializer_of(type(self))(self)
 
     pass
 
 
+def enum_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def enum_converter(enum_class: type[enum.Enum] | None) -> Callable:
+    """ Member to value through a dict, reading .value of a member is the slow part """
+    if enum_class is None:
+        return enum_value
+    values = {member: member.value for member in enum_class}
+    return lambda value: values.get(value, value)
+
+
+def datetime_value(value):
+    return value.isoformat() if value is not None else None
+
+
+def date_value(value):
+    return value.strftime('%Y-%m-%d') if value is not None else None
+
+
+def time_value(value):
+    return value.strftime('%H:%M:%S') if value is not None else None
+
+
+def as_is(value):
+    return value
+
+
+def related_list(value):
+    return [item.as_dict() for item in value]
+
+
+def related_one(value):
+    return value.as_dict() if value is not None else None
+
+
+def column_converter(column_type) -> Callable:
+    """ json conversion of a column value, picked from the column type """
+    if isinstance(column_type, Enum):
+        return enum_converter(column_type.enum_class)
+    if isinstance(column_type, DateTime):
+        return datetime_value
+    if isinstance(column_type, Date):
+        return date_value
+    if isinstance(column_type, Time):
+        return time_value
+    return as_is
+
+
+def compile_serializer(model: type[Base]) -> Callable[[Base], dict]:
+    """
+    Serializer of one model, built once from its mapper. Columns needing no conversion are copied in one go,
+    the others go through the (key, converter) pairs picked from their column type, relationships through
+    as_dict. Values are read from the instance __dict__, so unloaded attributes are left out and nothing is
+    lazy loaded.
+    """
+    mapper = inspect(model)
+    fields = [(attribute.key, column_converter(attribute.columns[0].type)) for attribute in mapper.column_attrs]
+    fields += [(related.key, related_list if related.uselist else related_one) for related in mapper.relationships]
+    plain = [key for key, converter in fields if converter is as_is]
+    converted = [(key, converter) for key, converter in fields if converter is not as_is]
+    # a loaded instance has every plain column, read them with one call
+    read_plain = itemgetter(*plain) if len(plain) > 1 else None
+
+    def serialize(instance: Base) -> dict:
+        values = instance.__dict__
+        try:
+            result = dict(zip(plain, read_plain(values)))
+        except (KeyError, TypeError):
+            result = {key: values[key] for key in plain if key in values}
+        for key, converter in converted:
+            if key in values:
+                result[key] = converter(values[key])
+        return result
+
+    return serialize
+
+
+serializers: dict[type, Callable[[Base], dict]] = {}
+
+
+def serializer_of(model: type[Base]) -> Callable[[Base], dict]:
+    serializer = serializers.get(model)
+    if serializer is None:
+        serializer = serializers[model] = compile_serializer(model)
+    return serializer
+
+
 class Department(Base):
     __tablename__ = "department"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -47,7 +121,8 @@ class Role(Base):
     description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     last_updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
-    permissions: Mapped[List["RolePermission"]] = relationship("RolePermission")
+    # ordered, the reference data content hash (the ETag) must be the same on every worker and reload
+    permissions: Mapped[List["RolePermission"]] = relationship("RolePermission", order_by="RolePermission.id")
 
 
 class Permission(Base):
@@ -101,6 +176,12 @@ class UserAccount(Base):
     created: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     last_updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    # /users ordering and its department filter, see db/migrations/m0004_user_listing_indexes.py
+    __table_args__ = (
+        Index("ix_user_account_firstname_id", "firstname", "id"),
+        Index("ix_user_account_department_firstname_id", "department", "firstname", "id"),
+    )
+
 
 class ActiveUserType(enum.Enum):
     pending = "pending"
@@ -144,6 +225,14 @@ class UserToken(Base):
     last_updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
+class RevokedToken(Base):
+    __tablename__ = "revoked_token"
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    username: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    expired_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
 class FormProductivity(enum.Enum):
     no_productivity = "Không tính công"
     productivity = "Tính công"
@@ -211,7 +300,61 @@ class Form(Base):
     note: Mapped[str] = mapped_column(String, nullable=True)
     created: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     last_updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
-    details: Mapped[List["FormDetail"]] = relationship("FormDetail")
+    details: Mapped[List["FormDetail"]] = relationship("FormDetail", order_by="FormDetail.id")
+
+    # listing / count filters, see db/migrations/m0002_form_listing_indexes.py
+    __table_args__ = (
+        Index("ix_form_created_user_status_created", "created_user", "form_status", "created", "id"),
+        Index("ix_form_assigned_user_status_created", "assigned_user", "form_status", "created", "id"),
+        Index("ix_form_department_status_created", "department", "form_status", "created", "id"),
+        Index("ix_form_status_created", "form_status", "created", "id"),
+        Index("ix_form_created", "created", "id"),
+    )
+
+
+class FormCounter(Base):
+    """ Number of forms per (scope, owner, form_status), maintained with every form write """
+    __tablename__ = "form_counter"
+    scope: Mapped[str] = mapped_column(String, primary_key=True)
+    owner: Mapped[str] = mapped_column(String, primary_key=True)
+    form_status: Mapped[str] = mapped_column(String, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ManagementChain(Base):
+    """ Closure of user_account.line_manager: one row per manager and each user below them, at any depth """
+    __tablename__ = "management_chain"
+    manager: Mapped[str] = mapped_column(String, ForeignKey("user_account.username", onupdate='CASCADE',
+                                                            ondelete='CASCADE'), primary_key=True)
+    member: Mapped[str] = mapped_column(String, ForeignKey("user_account.username", onupdate='CASCADE',
+                                                           ondelete='CASCADE'), primary_key=True)
+    # 0 for the row of a user with themselves, 1 for a direct report
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # the chain above a user, the primary key serves the subtree below one
+    __table_args__ = (
+        Index("ix_management_chain_member", "member"),
+    )
+
+
+class AttendanceDay(Base):
+    """ Hours of one form on one day, derived from its details by features/form/attendance.py """
+    __tablename__ = "attendance_day"
+    form: Mapped[int] = mapped_column(Integer, ForeignKey("form.id", ondelete='CASCADE'), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    username: Mapped[str] = mapped_column(String, nullable=False)
+    department: Mapped[str] = mapped_column(String, nullable=False)
+    reason: Mapped[int] = mapped_column(Integer, nullable=False)
+    form_type: Mapped[str] = mapped_column(String, nullable=False)
+    form_status: Mapped[str] = mapped_column(String, nullable=False)
+    productivity: Mapped[str] = mapped_column(String, nullable=False)
+    hours: Mapped[float] = mapped_column(Numeric(8, 2), nullable=False)
+    productive_hours: Mapped[float] = mapped_column(Numeric(8, 2), nullable=False)
+
+    # reports scan a day range, most often of one department
+    __table_args__ = (
+        Index("ix_attendance_day_day_department", "day", "department"),
+    )
 
 
 class FormDetail(Base):
@@ -222,3 +365,8 @@ class FormDetail(Base):
     to_time: Mapped[time] = mapped_column(Time, nullable=False)
     from_date: Mapped[date] = mapped_column(Date, nullable=False)
     to_date: Mapped[date] = mapped_column(Date, nullable=False)
+    # created_user of the form, so the overlap check finds the details of one user without the form table.
+    # Its GiST index over (username, period) needs btree_gist, it is built by
+    # db/migrations/m0006_form_detail_overlap.py only, see features/form/form_conflict.py
+    username: Mapped[str] = mapped_column(String, ForeignKey("user_account.username", onupdate='CASCADE'),
+                                          nullable=False)
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from uuid import uuid4
+
+from sqlalchemy import Engine, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+
+""" Connection pool - settings from .env and live statistics of checkouts """
+
+
+def is_pgbouncer_mode() -> bool:
+    # pgbouncer (transaction pooling) owns the pooling: no app side pool, no named prepared statement reuse
+    return os.getenv("DB_PGBOUNCER_MODE", "false").lower() == "true"
+
+
+class PoolStatistics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def as_dict(self) -> dict:
+        attempts = self.checkouts + self.timeouts
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / attempts, 3) if attempts else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+class TimedPoolMixin:
+    """ Measures how long each checkout waits for a connection, including connecting a new one """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statistics = PoolStatistics()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.statistics.record(time.perf_counter() - started_at, timed_out=True)
+            raise
+        self.statistics.record(time.perf_counter() - started_at, timed_out=False)
+        return record
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(TimedPoolMixin, NullPool):
+    pass
+
+
+def engine_options(is_async: bool) -> dict:
+    """ Keyword arguments of create_engine / create_async_engine """
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+               "pool_recycle": int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))}
+    if is_pgbouncer_mode():
+        options["poolclass"] = TimedNullPool
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0,
+                                       "prepared_statement_cache_size": 0,
+                                       "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"}
+        return options
+
+    options.update(poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+                   pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+                   max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", 10)),
+                   pool_timeout=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30)))
+    return options
+
+
+def pool_status(engine: Engine | AsyncEngine) -> dict:
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__, "pgbouncer_mode": is_pgbouncer_mode()}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    if isinstance(pool, TimedPoolMixin):
+        status.update(pool.statistics.as_dict())
+    return status
@@ -3,12 +3,14 @@ from typing import Annotated
 
 from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from db import models
 from db.database import get_db
+from features.reference.reference_data import reference_data, reference_cacheable
 from features.security.token import Token, validate_token
+from utils.serializer import JsonSerializer
 
 
 class DepartmentRequest(BaseModel):
@@ -24,25 +26,31 @@ class DepartmentResponse(BaseModel):
     last_updated: datetime
 
 
+departments_serializer = JsonSerializer(list[DepartmentResponse])
+
+
 def route(app: FastAPI):
     @app.get("/department/{department_name}", response_model=DepartmentResponse)
-    def get(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
-            department_name: str):
-        return db.query(models.Department).filter(models.Department.name == department_name).first()
+    async def get(current_user: Annotated[Token, Depends(validate_token)],
+                  cache_headers: Annotated[dict, Depends(reference_cacheable)], department_name: str):
+        return reference_data.snapshot.departments_by_name.get(department_name)
 
     @app.get("/departments", response_model=list[DepartmentResponse])
-    def get_all(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.query(models.Department).order_by(models.Department.name.desc()).all()
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      cache_headers: Annotated[dict, Depends(reference_cacheable)]):
+        return departments_serializer.response(reference_data.snapshot.departments, headers=cache_headers)
 
     @app.post("/department", response_model=DepartmentResponse, status_code=status.HTTP_201_CREATED)
-    def create(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
-               request: DepartmentRequest):
+    async def create(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
+                     request: DepartmentRequest):
         try:
             department = models.Department(**request.model_dump())
             db.add(department)
-            db.commit()
-            db.refresh(department)
+            await db.commit()
+            await db.refresh(department)
+            await reference_data.reload_after_write()
             return department
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
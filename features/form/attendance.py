@@ -0,0 +1,98 @@
+from datetime import date
+from typing import Annotated
+
+from fastapi import FastAPI, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, func, delete, text, bindparam, any_, ARRAY, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models
+from db.database import get_read_db
+from features.security.token import Token, validate_token
+
+"""
+Attendance - the attendance_day fact table: per form and day, the hours its details cover and how many of
+them count as worked. Form writers call refresh_forms in their own transaction, reports aggregate the table.
+"""
+
+# share of the hours counted as worked, per form productivity
+productive_share = {models.FormProductivity.productivity.name: 1,
+                    models.FormProductivity.half_productivity.name: 0.5,
+                    models.FormProductivity.no_productivity.name: 0}
+
+# every detail covers from_time - to_time on each day of from_date - to_date, a to_time before the
+# from_time ends on the next day
+attendance_days_sql = f"""
+    SELECT f.id, d.day::date, f.created_user, f.department, f.reason, f.form_type::text, f.form_status::text,
+           f.productivity::text, round(sum(d.hours), 2),
+           round(sum(d.hours) * CASE f.productivity::text
+               {" ".join(f"WHEN '{name}' THEN {share}" for name, share in productive_share.items())} ELSE 0 END, 2)
+    FROM form f
+    JOIN LATERAL (
+        SELECT day, (extract(epoch FROM fd.to_time - fd.from_time)
+                     + CASE WHEN fd.to_time < fd.from_time THEN 86400 ELSE 0 END) / 3600 AS hours
+        FROM form_detail fd, generate_series(fd.from_date, fd.to_date, interval '1 day') AS day
+        WHERE fd.form = f.id
+    ) d ON true
+"""
+
+insert_sql = ("INSERT INTO attendance_day (form, day, username, department, reason, form_type, form_status, "
+              "productivity, hours, productive_hours) {select} GROUP BY f.id, d.day")
+
+
+async def refresh_forms(db: AsyncSession, form_ids: list[int]):
+    """ Recompute the days of the given forms, the caller flushed its changes and commits """
+    if not form_ids:
+        return
+    ids = bindparam("form_ids", list(form_ids), type_=ARRAY(Integer))
+    await db.execute(delete(models.AttendanceDay).where(models.AttendanceDay.form == any_(ids)))
+    await db.execute(text(insert_sql.format(select=attendance_days_sql + " WHERE f.id = ANY(:form_ids)"))
+                     .bindparams(ids))
+
+
+group_columns = {"department": models.AttendanceDay.department, "reason": models.AttendanceDay.reason,
+                 "form_type": models.AttendanceDay.form_type, "username": models.AttendanceDay.username}
+
+
+class AttendanceReportRow(BaseModel):
+    day: date | None = None
+    key: str | int
+    forms: int
+    hours: float
+    productive_hours: float
+    non_productive_hours: float
+
+
+def route(app: FastAPI):
+    @app.get("/reports/attendance", response_model=list[AttendanceReportRow])
+    async def attendance_report(current_user: Annotated[Token, Depends(validate_token)],
+                                db: Annotated[AsyncSession, Depends(get_read_db)],
+                                from_date: date, to_date: date, group_by: str = "department", per_day: bool = True,
+                                department: str | None = None, form_status: str = "approved"):
+        """ Hours of approved forms by default, "all" adds the pending ones; cancelled forms took no hours """
+        if group_by not in group_columns:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown group_by {group_by}, expected one of {sorted(group_columns)}")
+        if form_status != "all" and form_status not in models.FormStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown form status {form_status}")
+
+        key = group_columns[group_by].label("key")
+        groups = [models.AttendanceDay.day, key] if per_day else [key]
+        hours = func.sum(models.AttendanceDay.hours)
+        productive_hours = func.sum(models.AttendanceDay.productive_hours)
+        conditions = [models.AttendanceDay.day.between(from_date, to_date)]
+        if department is not None:
+            conditions.append(models.AttendanceDay.department == department)
+        if form_status == "all":
+            conditions.append(models.AttendanceDay.form_status != models.FormStatus.cancelled.name)
+        else:
+            conditions.append(models.AttendanceDay.form_status == form_status)
+
+        rows = await db.execute(select(*groups, func.count(models.AttendanceDay.form.distinct()).label("forms"),
+                                       hours.label("hours"), productive_hours.label("productive_hours"),
+                                       (hours - productive_hours).label("non_productive_hours"))
+                                .where(*conditions)
+                                .group_by(*groups)
+                                .order_by(*groups))
+        return [row._asdict() for row in rows]
@@ -0,0 +1,151 @@
+from typing import Annotated
+
+from fastapi import FastAPI, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models
+from db.database import get_db
+from features.form import form_counter, attendance, form_conflict
+from features.form.form_controller import CreateFormRequest, form_phase_of
+from features.security.token import Token, validate_token
+
+max_bulk_forms = 500
+
+
+class BulkCreateFormRequest(BaseModel):
+    # "all_or_nothing": nothing is created if any form is invalid, "best_effort": valid forms are created
+    mode: str = "all_or_nothing"
+    forms: list[CreateFormRequest]
+
+
+class BulkFormResult(BaseModel):
+    index: int
+    id: int | None = None
+    error: str | None = None
+
+
+class BulkCreateFormResponse(BaseModel):
+    created_count: int = 0
+    failed_count: int = 0
+    results: list[BulkFormResult] = []
+
+
+async def find_invalid_forms(db: AsyncSession, forms: list[CreateFormRequest]) -> dict[int, str]:
+    """ Check the references of all forms with one query per referenced table, then their overlaps """
+    reasons = set((await db.scalars(select(models.FormReason.id)
+                                    .where(models.FormReason.id.in_({f.reason for f in forms})))).all())
+    usernames = set((await db.scalars(select(models.UserAccount.username)
+                                      .where(models.UserAccount.username.in_(
+                                          {f.created_user for f in forms} | {f.assigned_user for f in forms}))))
+                    .all())
+    departments = set((await db.scalars(select(models.Department.name)
+                                        .where(models.Department.name.in_({f.department for f in forms})))).all())
+    roles = set((await db.scalars(select(models.Role.name).where(models.Role.name.in_({f.role for f in forms}))))
+                .all())
+
+    errors = {}
+    for index, form in enumerate(forms):
+        if form.form_type not in models.FormType.__members__:
+            errors[index] = f"Unknown form type {form.form_type}"
+        elif form.productivity not in models.FormProductivity.__members__:
+            errors[index] = f"Unknown productivity {form.productivity}"
+        elif form.reason not in reasons:
+            errors[index] = f"Unknown reason {form.reason}"
+        elif form.created_user not in usernames:
+            errors[index] = f"Unknown user {form.created_user}"
+        elif form.assigned_user not in usernames:
+            errors[index] = f"Unknown user {form.assigned_user}"
+        elif form.department not in departments:
+            errors[index] = f"Unknown department {form.department}"
+        elif form.role not in roles:
+            errors[index] = f"Unknown role {form.role}"
+
+    # details overlapping stored ones of the same user or ones of an earlier form of this request, one query
+    checked = [(index, form) for index, form in enumerate(forms) if index not in errors]
+    if checked:
+        await form_conflict.lock_users(db, {form.created_user for _, form in checked})
+    positions = [(index, position) for index, form in checked for position in range(len(form.details))]
+    for conflict in await form_conflict.find_conflicts(
+            db, [(form.created_user, detail) for _, form in checked for detail in form.details]):
+        index, position = positions[conflict.index]
+        other = conflict.conflicts_with
+        if other.index is None:
+            errors.setdefault(index, f"Detail {position} overlaps detail {other.detail} of form {other.form}")
+        else:
+            other_index, other_position = positions[other.index]
+            errors.setdefault(index, f"Detail {position} overlaps detail {other_position} of form at index "
+                                     f"{other_index}")
+    return dict(sorted(errors.items()))
+
+
+async def insert_forms(db: AsyncSession, forms: list[CreateFormRequest]) -> list[int]:
+    """ Insert forms with one multi-row INSERT ... RETURNING, then all of their details in one batch, uncounted """
+    form_ids = (await db.scalars(
+        insert(models.Form).returning(models.Form.id, sort_by_parameter_order=True),
+        [{"form_type": form.form_type, "department": form.department, "role": form.role,
+          "description": form.description, "note": form.note, "reason": form.reason,
+          "productivity": form.productivity, "created_user": form.created_user,
+          "assigned_user": form.assigned_user, "form_phase": form_phase_of(form.role)}
+         for form in forms])).all()
+
+    details = [{"form": form_id, "username": form.created_user, **detail.model_dump()}
+               for form_id, form in zip(form_ids, forms) for detail in form.details]
+    if details:
+        await db.execute(insert(models.FormDetail), details)
+
+    await attendance.refresh_forms(db, form_ids)
+    return list(form_ids)
+
+
+def route(app: FastAPI):
+    @app.post("/forms/bulk", response_model=BulkCreateFormResponse)
+    async def bulk_create(current_user: Annotated[Token, Depends(validate_token)],
+                          db: Annotated[AsyncSession, Depends(get_db)],
+                          request: BulkCreateFormRequest):
+        if request.mode not in ("all_or_nothing", "best_effort"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown mode {request.mode}")
+        if len(request.forms) > max_bulk_forms:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"At most {max_bulk_forms} forms can be submitted at once")
+
+        try:
+            errors = await find_invalid_forms(db, request.forms) if request.forms else {}
+            if errors and request.mode == "all_or_nothing":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=[{"index": index, "error": error} for index, error in errors.items()])
+
+            valid_indexes = [index for index in range(len(request.forms)) if index not in errors]
+            created_ids = {}
+            if valid_indexes:
+                try:
+                    async with db.begin_nested():
+                        form_ids = await insert_forms(db, [request.forms[index] for index in valid_indexes])
+                    created_ids = dict(zip(valid_indexes, form_ids))
+                except Exception as e:
+                    if request.mode == "all_or_nothing":
+                        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{e}")
+
+                    # best effort: isolate the failing forms, one savepoint per form
+                    for index in valid_indexes:
+                        try:
+                            async with db.begin_nested():
+                                created_ids[index] = (await insert_forms(db, [request.forms[index]]))[0]
+                        except Exception as item_error:
+                            errors[index] = f"{item_error}"
+
+            await form_counter.apply_changes(db, added=[
+                (form.created_user, form.assigned_user, form.department, models.FormStatus.pending.name)
+                for form in (request.forms[index] for index in created_ids)])
+            await db.commit()
+            return {
+                "created_count": len(created_ids),
+                "failed_count": len(errors),
+                "results": [{"index": index, "id": created_ids.get(index), "error": errors.get(index)}
+                            for index in range(len(request.forms))]
+            }
+        except Exception as e:
+            await db.rollback()
+            raise e
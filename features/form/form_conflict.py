@@ -0,0 +1,149 @@
+from datetime import date, time
+from typing import Annotated
+
+from fastapi import FastAPI, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, text, bindparam, ARRAY, String, Date, Time, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models
+from db.database import get_read_db
+from features.security.token import Token, validate_token
+
+"""
+Form conflicts - details of one user covering the same hours. A detail covers from_time - to_time on each day
+of from_date - to_date, a to_time before the from_time ends on the next day. Two details overlap when their
+periods (first start to last end) overlap and their daily windows do.
+Periods are looked up through the GiST index on form_detail (username, period), so a check costs
+the same however many forms the user has. Cancelled forms never conflict.
+"""
+
+
+def period_sql(alias: str = "") -> str:
+    """ From the first start to the last end of a detail, the expression of the GiST index when alias is empty """
+    prefix = f"{alias}." if alias else ""
+    return (f"tsrange({prefix}from_date + {prefix}from_time, {prefix}to_date + {prefix}to_time"
+            f" + CASE WHEN {prefix}to_time < {prefix}from_time THEN interval '1 day' ELSE interval '0' END)")
+
+
+def covers_sql(window: str, at: str) -> str:
+    return (f"CASE WHEN {window}.from_time <= {window}.to_time"
+            f" THEN {at} >= {window}.from_time AND {at} < {window}.to_time"
+            f" ELSE {at} >= {window}.from_time OR {at} < {window}.to_time END")
+
+
+def overlap_sql(a: str, b: str) -> str:
+    return (f"{period_sql(a)} && {period_sql(b)}"
+            f" AND ({covers_sql(a, f'{b}.from_time')} OR {covers_sql(b, f'{a}.from_time')})")
+
+
+# requested details against the stored ones and against the requested ones before them
+find_conflicts_sql = f"""
+    WITH requested AS (
+        SELECT * FROM unnest(:usernames, :from_dates, :to_dates, :from_times, :to_times)
+            WITH ORDINALITY AS r(username, from_date, to_date, from_time, to_time, index)
+    )
+    SELECT r.index - 1 AS index, NULL AS other_index, d.form, d.id AS detail,
+           d.from_date, d.to_date, d.from_time, d.to_time
+    FROM requested r
+    JOIN form_detail d ON d.username = r.username AND {overlap_sql("d", "r")}
+    JOIN form f ON f.id = d.form AND f.form_status <> 'cancelled' AND f.id IS DISTINCT FROM :form_id
+    UNION ALL
+    SELECT r.index - 1, o.index - 1, NULL, NULL, o.from_date, o.to_date, o.from_time, o.to_time
+    FROM requested r
+    JOIN requested o ON o.username = r.username AND o.index < r.index AND {overlap_sql("o", "r")}
+    ORDER BY 1, 3, 4
+"""
+
+list_conflicts_sql = f"""
+    SELECT a.form, a.id AS detail, a.from_date, a.to_date, a.from_time, a.to_time,
+           b.form AS other_form, b.id AS other_detail, b.from_date AS other_from_date, b.to_date AS other_to_date,
+           b.from_time AS other_from_time, b.to_time AS other_to_time
+    FROM form_detail a
+    JOIN form fa ON fa.id = a.form AND fa.form_status <> 'cancelled'
+    JOIN form_detail b ON b.username = a.username AND b.id > a.id AND {overlap_sql("a", "b")}
+    JOIN form fb ON fb.id = b.form AND fb.form_status <> 'cancelled'
+    WHERE a.username = :username
+      AND {period_sql("a")} && tsrange(CAST(:from_date AS date), CAST(:to_date AS date) + 1, '[)')
+    ORDER BY a.from_date, a.id, b.id
+"""
+
+
+class ConflictingDetail(BaseModel):
+    # a stored detail has a form and an id, one of the same request its index there
+    form: int | None = None
+    detail: int | None = None
+    index: int | None = None
+    from_date: date
+    to_date: date
+    from_time: time
+    to_time: time
+
+
+class DetailConflict(BaseModel):
+    index: int
+    conflicts_with: ConflictingDetail
+
+
+class FormConflict(BaseModel):
+    detail: ConflictingDetail
+    conflicts_with: ConflictingDetail
+
+
+async def lock_users(db: AsyncSession, usernames: set[str]):
+    """
+    Serialize the writers of the same users until commit, so two concurrent requests can not both pass the check.
+    FOR NO KEY UPDATE leaves the key share locks of form foreign keys alone.
+    """
+    await db.execute(select(models.UserAccount.id).where(models.UserAccount.username.in_(usernames))
+                     .order_by(models.UserAccount.username).with_for_update(key_share=True))
+
+
+async def find_conflicts(db: AsyncSession, details: list[tuple[str, object]],
+                         form_id: int | None = None) -> list[DetailConflict]:
+    """
+    Conflicts of the (username, detail) pairs about to be stored, by their index in details.
+    The details of form_id are left out, they are the ones being replaced.
+    """
+    if not details:
+        return []
+    rows = (await db.execute(text(find_conflicts_sql).bindparams(
+        bindparam("usernames", [username for username, _ in details], type_=ARRAY(String)),
+        bindparam("from_dates", [detail.from_date for _, detail in details], type_=ARRAY(Date)),
+        bindparam("to_dates", [detail.to_date for _, detail in details], type_=ARRAY(Date)),
+        bindparam("from_times", [detail.from_time for _, detail in details], type_=ARRAY(Time)),
+        bindparam("to_times", [detail.to_time for _, detail in details], type_=ARRAY(Time)),
+        bindparam("form_id", form_id, type_=Integer)))).all()
+    return [DetailConflict(index=row.index, conflicts_with=ConflictingDetail(
+        form=row.form, detail=row.detail, index=row.other_index, from_date=row.from_date, to_date=row.to_date,
+        from_time=row.from_time, to_time=row.to_time)) for row in rows]
+
+
+async def check_conflicts(db: AsyncSession, username: str, details: list, form_id: int | None = None):
+    """ Lock the user and reject details overlapping each other or the user's other forms """
+    await lock_users(db, {username})
+    conflicts = await find_conflicts(db, [(username, detail) for detail in details], form_id)
+    if conflicts:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=[conflict.model_dump(mode="json") for conflict in conflicts])
+
+
+def route(app: FastAPI):
+    @app.get("/forms/conflicts", response_model=list[FormConflict])
+    async def get_conflicts(current_user: Annotated[Token, Depends(validate_token)],
+                            db: Annotated[AsyncSession, Depends(get_read_db)],
+                            from_date: date = date.min, to_date: date = date(9999, 12, 30)):
+        """ Pairs of overlapping details in the caller's forms, the first one within from_date - to_date """
+        if from_date > to_date:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from_date is after to_date")
+
+        rows = (await db.execute(text(list_conflicts_sql),
+                                 {"username": current_user.username, "from_date": from_date,
+                                  "to_date": to_date})).all()
+        return [{"detail": {"form": row.form, "detail": row.detail, "from_date": row.from_date,
+                            "to_date": row.to_date, "from_time": row.from_time, "to_time": row.to_time},
+                 "conflicts_with": {"form": row.other_form, "detail": row.other_detail,
+                                    "from_date": row.other_from_date, "to_date": row.other_to_date,
+                                    "from_time": row.other_from_time, "to_time": row.other_to_time}}
+                for row in rows]
@@ -1,16 +1,21 @@
-from datetime import time, date
+from datetime import time, date, datetime
 from typing import Annotated
 
 from fastapi import FastAPI, Depends, UploadFile, Form, HTTPException
 from pydantic import BaseModel
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete, insert, tuple_, any_, bindparam, ARRAY, Integer, \
+    update as update_statement
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
 from starlette import status
 
 from db import models, schemas
-from db.database import get_db
+from db.database import get_db, get_read_db
+from features.form import form_counter, attendance, form_conflict
 from features.security.token import Token, validate_token
 from features.user_account import user_account_service
+from utils.cursor import encode_cursor, decode_cursor
+from utils.serializer import JsonSerializer
 
 
 class CreateFormDetailRequest(BaseModel):
@@ -21,7 +26,8 @@ class CreateFormDetailRequest(BaseModel):
 
 
 class UpdateFormDetailRequest(CreateFormDetailRequest):
-    pass
+    # id of the existing detail being edited, None for a new one
+    id: int | None = None
 
 
 class FormRequest(BaseModel):
@@ -52,197 +58,263 @@ class CreateFormResponse(schemas.Form):
         orm_mode: True
 
 
+class ConfirmFormResponse(BaseModel):
+    id: int
+    form_status: str
+
+
 class AllFormsResponse(BaseModel):
-    total_count: int = 0
+    total_count: int | None = 0
     data: list[schemas.Form] = []
+    next_cursor: str | None = None
+
+
+all_forms_serializer = JsonSerializer(AllFormsResponse)
+max_forms_page_size = 100
+
+# relationships serialized by schemas.Form, an async session can not lazy load them.
+# many-to-one ones are joined into the form query, details come from one extra IN query,
+# so any page of forms costs exactly two queries
+form_relationships = (joinedload(models.Form.form_reason, innerjoin=True),
+                      joinedload(models.Form.created_user_obj, innerjoin=True),
+                      joinedload(models.Form.assigned_user_obj, innerjoin=True),
+                      selectinload(models.Form.details))
+
+
+def form_phase_of(role: str) -> str:
+    """ Forms of leads and heads go to the director, the others to the direct manager """
+    if any(word in role.lower() for word in ("lead", "leader", "head")):
+        return models.FormPhase.director_approved.name
+    else:
+        return models.FormPhase.direct_manager_approved.name
+
+
+async def load_form(db: AsyncSession, form_id: int) -> models.Form:
+    return await db.get_one(models.Form, form_id, options=form_relationships, populate_existing=True)
+
+
+async def list_forms(db: AsyncSession, conditions: list, page: int, page_size: int, cursor: str | None,
+                     include_total: bool) -> dict:
+    """
+    Newest forms first. Without a cursor the page is picked by offset, with one it starts right after
+    the (created, id) of the cursor, which costs the same however deep the page is.
+    The total comes from a window count over the same statement, so page and total are one query.
+    """
+    if not 1 <= page_size <= max_forms_page_size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"page_size must be between 1 and {max_forms_page_size}")
+    count_in_page = include_total and cursor is None
+    statement = (select(models.Form, func.count().over().label("total_count")) if count_in_page
+                 else select(models.Form))
+    statement = (statement.options(*form_relationships).where(*conditions)
+                 .order_by(models.Form.created.desc(), models.Form.id.desc()).limit(page_size))
+    if cursor is None:
+        statement = statement.offset(page * page_size if page >= 1 else 0)
+    else:
+        created, form_id = decode_cursor(cursor, str, int)
+        try:
+            created = datetime.fromisoformat(created)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        statement = statement.where(tuple_(models.Form.created, models.Form.id) < tuple_(created, form_id))
+
+    rows = (await db.execute(statement)).all()
+    forms = [row[0] for row in rows]
+    if count_in_page and rows:
+        total_count = rows[0].total_count
+    elif include_total and (cursor is not None or page >= 1):
+        # a cursor narrows the window, a page past the end has no row to carry the count
+        total_count = await db.scalar(select(func.count()).select_from(models.Form).where(*conditions))
+    else:
+        total_count = 0 if include_total else None
+
+    return {
+        "total_count": total_count,
+        "data": forms,
+        "next_cursor": encode_cursor(forms[-1].created.isoformat(), forms[-1].id) if len(forms) == page_size else None
+    }
+
+
+def detail_values(detail) -> tuple:
+    return detail.from_time, detail.to_time, detail.from_date, detail.to_date
+
+
+async def apply_detail_changes(db: AsyncSession, form: models.Form, details: list[UpdateFormDetailRequest]):
+    """
+    Write only the difference between the stored details and the requested ones.
+    A detail with an id edits that row; one without an id first takes an identical stored row,
+    then any stored row left unclaimed. Rows still unclaimed are deleted, requests still unmatched inserted.
+    The session flushes only changed columns, so an unchanged detail is never written.
+    """
+    stored = {detail.id: detail for detail in form.details}
+    unknown_ids = {detail.id for detail in details if detail.id is not None} - stored.keys()
+    if unknown_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Details {sorted(unknown_ids)} do not belong to form {form.id}")
+
+    requested_ids = {detail.id for detail in details}
+    unclaimed = {id: detail for id, detail in stored.items() if id not in requested_ids}
+    pairs, unmatched = [], []
+    for detail in details:
+        if detail.id is not None:
+            pairs.append((stored[detail.id], detail))
+            continue
+        same = next((id for id, row in unclaimed.items() if detail_values(row) == detail_values(detail)), None)
+        if same is None:
+            unmatched.append(detail)
+        else:
+            unclaimed.pop(same)
+
+    for detail in list(unmatched):
+        if not unclaimed:
+            break
+        pairs.append((unclaimed.popitem()[1], detail))
+        unmatched.remove(detail)
+
+    for row, detail in pairs:
+        for var, value in detail.model_dump(exclude={"id"}).items():
+            setattr(row, var, value)
+    if unclaimed:
+        await db.execute(delete(models.FormDetail).where(models.FormDetail.id.in_(unclaimed))
+                         .execution_options(synchronize_session=False))
+    if unmatched:
+        await db.execute(insert(models.FormDetail),
+                         [{"form": form.id, "username": form.created_user, **detail.model_dump(exclude={"id"})}
+                          for detail in unmatched])
+
+
+def status_conditions(form_status: str) -> list:
+    return [] if form_status == 'all' else [models.Form.form_status == form_status]
 
 
 def route(app: FastAPI):
     @app.get("/forms/{type}/count")
     async def count_all(current_user: Annotated[Token, Depends(validate_token)],
-                        db: Annotated[Session, Depends(get_db)], type: str):
+                        db: Annotated[AsyncSession, Depends(get_read_db)], type: str):
 
         match type:
-            case 'request':
-                query_statement = f"""
-                    SELECT
-                        SUM(CASE WHEN form_status = 'pending' AND created_user = '{current_user.username}' THEN 1 ELSE 0 END) AS pending,
-                        SUM(CASE WHEN form_status = 'approved' AND created_user = '{current_user.username}' THEN 1 ELSE 0 END) AS approved,
-                        SUM(CASE WHEN form_status = 'cancelled' AND created_user = '{current_user.username}' THEN 1 ELSE 0 END) AS cancelled
-                    FROM form;
-                """
-            case 'approve':
-                query_statement = f"""
-                   SELECT
-                        SUM(CASE WHEN form_status = 'pending' AND assigned_user = '{current_user.username}' THEN 1 ELSE 0 END) AS pending,
-                        SUM(CASE WHEN form_status = 'approved' AND assigned_user = '{current_user.username}' THEN 1 ELSE 0 END) AS approved,
-                        SUM(CASE WHEN form_status = 'cancelled' AND assigned_user = '{current_user.username}' THEN 1 ELSE 0 END) AS cancelled
-                    FROM form;
-                """
+            case 'request' | 'approve':
+                owner = current_user.username
             case 'department':
-                query_statement = f"""
-                    SELECT
-                        SUM(CASE WHEN form_status = 'pending' AND department = '{current_user.department}' THEN 1 ELSE 0 END) AS pending,
-                        SUM(CASE WHEN form_status = 'approved' AND department = '{current_user.department}' THEN 1 ELSE 0 END) AS approved,
-                        SUM(CASE WHEN form_status = 'cancelled' AND department = '{current_user.department}' THEN 1 ELSE 0 END) AS cancelled
-                    FROM form;
-                """
+                owner = current_user.department
             case default:
-                query_statement = f"""
-                    SELECT
-                        SUM(CASE WHEN form_status = 'pending' THEN 1 ELSE 0 END) AS pending,
-                        SUM(CASE WHEN form_status = 'approved' THEN 1 ELSE 0 END) AS approved,
-                        SUM(CASE WHEN form_status = 'cancelled' THEN 1 ELSE 0 END) AS cancelled
-                    FROM form;
-                """
-
-        result = db.execute(text(query_statement)).mappings().fetchone()
-        response = {k: result[k] if result[k] is not None else 0 for k in result}
-        response['all'] = sum(response.values())
-        return response
+                owner = ''
+        return await form_counter.get_counts(db, form_counter.scopes.get(type, 'all'), owner)
 
     @app.get("/forms/{type}/{form_status}", response_model=AllFormsResponse)
     async def get_all_forms_by_type_and_status(current_user: Annotated[Token, Depends(validate_token)],
-                                               db: Annotated[Session, Depends(get_db)],
+                                               db: Annotated[AsyncSession, Depends(get_read_db)],
                                                type: str, form_status: str,
-                                               page: int = 0, page_size: int = 20):
-        offset = page * page_size if page >= 1 else 0
-        is_all_status = 1 if form_status == 'all' else 0
+                                               page: int = 0, page_size: int = 20, cursor: str | None = None,
+                                               include_total: bool = True):
         match type:
             case "request":
-                return {
-                    "total_count": db.query(models.Form).filter(models.Form.created_user == current_user.username,
-                                                                (
-                                                                        1 == is_all_status or models.Form.form_status == form_status)).count(),
-                    "data": (db.query(models.Form).filter(models.Form.created_user == current_user.username,
-                                                          (
-                                                                  1 == is_all_status or models.Form.form_status == form_status))
-                             .order_by(models.Form.created.desc()).offset(offset).limit(page_size).all())
-                }
+                scope_condition = models.Form.created_user == current_user.username
             case "approve":
-                return {
-                    "total_count": db.query(models.Form).filter(models.Form.assigned_user == current_user.username,
-                                                                (
-                                                                        1 == is_all_status or models.Form.form_status == form_status)).count(),
-                    "data": (db.query(models.Form).filter(models.Form.assigned_user == current_user.username,
-                                                          (
-                                                                  1 == is_all_status or models.Form.form_status == form_status))
-                             .order_by(models.Form.created.desc()).offset(offset).limit(page_size).all())
-                }
+                scope_condition = models.Form.assigned_user == current_user.username
             case "department":
-                return {
-                    "total_count": db.query(models.Form).filter(models.Form.department == current_user.department,
-                                                                (
-                                                                        1 == is_all_status or models.Form.form_status == form_status)).count(),
-                    "data": (db.query(models.Form).filter(models.Form.department == current_user.department,
-                                                          (
-                                                                  1 == is_all_status or models.Form.form_status == form_status))
-                             .order_by(models.Form.created.desc()).offset(offset).limit(page_size).all())
-                }
+                scope_condition = models.Form.department == current_user.department
             case default:
                 return {}
+        return all_forms_serializer.response(await list_forms(db, [scope_condition, *status_conditions(form_status)],
+                                                              page, page_size, cursor, include_total))
 
     @app.get("/forms/{form_status}", response_model=AllFormsResponse)
     async def get_all_forms_by_type(current_user: Annotated[Token, Depends(validate_token)],
-                                    db: Annotated[Session, Depends(get_db)],
-                                    form_status: str, page: int = 0, page_size: int = 20):
-        offset = page * page_size if page >= 1 else 0
-        is_all_status = 1 if form_status == 'all' else 0
-        return {
-            "total_count": db.query(models.Form).filter(
-                1 == is_all_status or models.Form.form_status == form_status).count(),
-            "data": (db.query(models.Form).filter(1 == is_all_status or models.Form.form_status == form_status)
-                     .order_by(models.Form.created.desc()).offset(offset).limit(page_size).all())
-        }
+                                    db: Annotated[AsyncSession, Depends(get_read_db)],
+                                    form_status: str, page: int = 0, page_size: int = 20, cursor: str | None = None,
+                                    include_total: bool = True):
+        return all_forms_serializer.response(await list_forms(db, status_conditions(form_status), page, page_size,
+                                                              cursor, include_total))
 
     @app.get("/form/{form_id}", response_model=schemas.Form | None)
-    async def get(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def get(current_user: Annotated[Token, Depends(validate_token)],
+                  db: Annotated[AsyncSession, Depends(get_read_db)],
                   form_id: int):
-        form = db.get_one(models.Form, form_id)
+        form = await db.get_one(models.Form, form_id, options=form_relationships)
         form.form_type = form.form_type.name
         return form
 
     @app.get("/form/{form_id}/detail", response_model=list[schemas.FormDetail])
     async def get_detail(current_user: Annotated[Token, Depends(validate_token)],
-                         db: Annotated[Session, Depends(get_db)],
+                         db: Annotated[AsyncSession, Depends(get_read_db)],
                          form_id: int):
-        return db.get_one(models.Form, form_id).details
+        return (await db.get_one(models.Form, form_id, options=[selectinload(models.Form.details)])).details
 
     @app.post("/form", status_code=status.HTTP_201_CREATED, response_model=CreateFormResponse)
-    async def create(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def create(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
                      request: CreateFormRequest):
         try:
+            await form_conflict.check_conflicts(db, request.created_user, request.details)
+
             # create form
             form = models.Form(form_type=request.form_type, department=request.department, role=request.role,
                                description=request.description, note=request.note,
                                reason=request.reason, productivity=request.productivity,
                                created_user=request.created_user, assigned_user=request.assigned_user)
-            if "lead" or "leader" or "head" in request.role.lower():
-                form.form_phase = models.FormPhase.director_approved.name
-            else:
-                form.form_phase = models.FormPhase.direct_manager_approved.name
+            form.form_phase = form_phase_of(request.role)
             db.add(form)
-            db.flush()
+            await db.flush()
 
             # create form detail
             form_details = [
-                models.FormDetail(form=form.id, **detail.model_dump())
+                models.FormDetail(form=form.id, username=form.created_user, **detail.model_dump())
                 for detail in request.details]
             db.add_all(form_details)
+            await db.flush()
+            await attendance.refresh_forms(db, [form.id])
 
-            db.commit()
-            db.refresh(form)
-            return form
+            await form_counter.apply_changes(db, added=[form_counter.counted_as(form)])
+            await db.commit()
+            return await load_form(db, form.id)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
 
     @app.put("/form", response_model=schemas.Form)
-    async def update(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def update(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
                      request: UpdateFormRequest):
         try:
-            form = db.get_one(models.Form, request.id)
+            form = await db.get_one(models.Form, request.id, options=[selectinload(models.Form.details)])
+            await form_conflict.check_conflicts(db, form.created_user, request.details, form.id)
+            counted_before = form_counter.counted_as(form)
             for var, value in vars(request).items():
                 if not isinstance(value, list):
                     setattr(form, var, value) if value else None
-
-            """ 
-                For quick and ease to implement update details of form
-                Delete all old records then insert new ones 
-            """
-            # delete all old details record
-            deleted_form_details = [detail.id for detail in form.details]
-            db.query(models.FormDetail).filter(models.FormDetail.id.in_(deleted_form_details)).delete(
-                synchronize_session=False)
-
-            # re-create form detail
-            form_details = [
-                models.FormDetail(form=form.id, **detail.model_dump())
-                for detail in request.details]
-            db.add_all(form_details)
-
-            db.commit()
-            db.refresh(form)
-            return form
+            counted_after = form_counter.counted_as(form)
+            await apply_detail_changes(db, form, request.details)
+            await db.flush()
+            await attendance.refresh_forms(db, [form.id])
+
+            await form_counter.apply_changes(db, removed=[counted_before], added=[counted_after])
+            await db.commit()
+            return await load_form(db, form.id)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
 
-    @app.put("/form/confirm", response_model=list[schemas.Form])
+    @app.put("/form/confirm", response_model=list[schemas.Form] | list[ConfirmFormResponse])
     async def assigned_user_confirm(current_user: Annotated[Token, Depends(validate_token)],
-                                    db: Annotated[Session, Depends(get_db)],
+                                    db: Annotated[AsyncSession, Depends(get_db)],
                                     form_id: Annotated[list[int], Form()], form_status: Annotated[str, Form()],
-                                    image: UploadFile | None = None):
+                                    image: UploadFile | None = None, compact: Annotated[bool, Form()] = False):
+        if form_status not in models.FormStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown form status {form_status}")
+
         try:
-            form = db.query(models.Form).filter(models.Form.id.in_(form_id),
-                                                models.Form.assigned_user == current_user.username).all()
-            # only assigned user is able to use this api
-            # if form.assigned_user != current_user.username:
-            if len(form) != len(form_id):
+            # only assigned user is able to use this api, checked before the face service is called
+            form_ids = bindparam("form_ids", form_id, type_=ARRAY(Integer))
+            assigned = await db.scalar(select(func.count()).select_from(models.Form)
+                                       .where(models.Form.id == any_(form_ids),
+                                              models.Form.assigned_user == current_user.username))
+            if assigned != len(set(form_id)):
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                                     detail="You do not have permission to perform this action.")
 
-            is_enable_2_verification = db.get_one(models.UserAccount, current_user.user_id).enable_2_verification
+            is_enable_2_verification = (await db.get_one(models.UserAccount,
+                                                         current_user.user_id)).enable_2_verification
             if is_enable_2_verification:
                 response_identity = await user_account_service.identity_with_service(current_user.username, image)
                 if response_identity is None:
@@ -255,10 +327,34 @@ def route(app: FastAPI):
                     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                         detail="Verify face is failed")
 
-            for f in form:
-                f.form_status = form_status
-            db.commit()
-            return form
+            # permission check again and status change in one statement, the locked rows keep their old status
+            # for the counters. Locking in id order keeps concurrent confirms from deadlocking, the ids are
+            # one array parameter so the statement is the same prepared one whatever their number
+            previous = (select(models.Form.id, models.Form.form_status)
+                        .where(models.Form.id == any_(form_ids), models.Form.assigned_user == current_user.username)
+                        .order_by(models.Form.id).with_for_update().cte("previous"))
+            confirmed = (await db.execute(
+                update_statement(models.Form).where(models.Form.id == previous.c.id).values(form_status=form_status)
+                .returning(models.Form.id, models.Form.form_status, previous.c.form_status.label("previous_status"),
+                           models.Form.created_user, models.Form.assigned_user, models.Form.department)
+                .execution_options(synchronize_session=False))).all()
+
+            # reassigned since the check above
+            if len(confirmed) != len(set(form_id)):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                                    detail="You do not have permission to perform this action.")
+
+            await attendance.refresh_forms(db, [f.id for f in confirmed])
+            await form_counter.apply_changes(
+                db, removed=[(f.created_user, f.assigned_user, f.department, f.previous_status.name)
+                             for f in confirmed],
+                added=[(f.created_user, f.assigned_user, f.department, form_status) for f in confirmed])
+            await db.commit()
+            if compact:
+                return [{"id": f.id, "form_status": f.form_status} for f in confirmed]
+            return (await db.scalars(select(models.Form).options(*form_relationships)
+                                     .where(models.Form.id == any_(form_ids))
+                                     .execution_options(populate_existing=True))).all()
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
@@ -0,0 +1,106 @@
+import asyncio
+import enum
+import sys
+from collections import Counter
+
+from sqlalchemy import text, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+from db.database import AsyncSessionLocal
+
+"""
+Form counters - per created_user, assigned_user, department and global ("all", owner '') number of forms
+in each status. Writers call apply_changes in their own transaction, so /forms/{type}/count reads one row
+per status. Every writer updates the global row, so apply_changes is the last statement before commit and
+the row lock is held for the commit only. Usage: python -m features.form.form_counter [check|rebuild]
+"""
+
+# /forms/{type}/count type -> counter scope
+scopes = {"request": "created_user", "approve": "assigned_user", "department": "department"}
+
+actual_counts_sql = """
+    SELECT 'created_user' AS scope, created_user AS owner, form_status::text AS form_status, count(*) AS count
+    FROM form GROUP BY created_user, form_status
+    UNION ALL
+    SELECT 'assigned_user', assigned_user, form_status::text, count(*) FROM form GROUP BY assigned_user, form_status
+    UNION ALL
+    SELECT 'department', department, form_status::text, count(*) FROM form GROUP BY department, form_status
+    UNION ALL
+    SELECT 'all', '', form_status::text, count(*) FROM form GROUP BY form_status
+"""
+
+
+def counted_as(form: models.Form) -> tuple[str, str, str, str]:
+    """ What a form contributes to the counters, taken before and after changing it """
+    form_status = form.form_status if form.form_status is not None else models.FormStatus.pending
+    form_status = form_status.name if isinstance(form_status, enum.Enum) else form_status
+    return form.created_user, form.assigned_user, form.department, form_status
+
+
+async def apply_changes(db: AsyncSession, removed: list[tuple] = (), added: list[tuple] = ()):
+    deltas = Counter()
+    for sign, forms in ((-1, removed), (1, added)):
+        for created_user, assigned_user, department, form_status in forms:
+            for key in (("created_user", created_user, form_status), ("assigned_user", assigned_user, form_status),
+                        ("department", department, form_status), ("all", "", form_status)):
+                deltas[key] += sign
+
+    # sorted, so concurrent writers lock counter rows in the same order
+    rows = [{"scope": scope, "owner": owner, "form_status": form_status, "count": delta}
+            for (scope, owner, form_status), delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+
+    statement = insert(models.FormCounter).values(rows)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[models.FormCounter.scope, models.FormCounter.owner, models.FormCounter.form_status],
+        set_={"count": models.FormCounter.count + statement.excluded.count}))
+
+
+async def get_counts(db: AsyncSession, scope: str, owner: str | None) -> dict:
+    rows = await db.execute(select(models.FormCounter.form_status, models.FormCounter.count)
+                            .where(models.FormCounter.scope == scope, models.FormCounter.owner == owner))
+    response = {form_status.name: 0 for form_status in models.FormStatus}
+    response.update({row.form_status: row.count for row in rows})
+    response['all'] = sum(response.values())
+    return response
+
+
+async def find_drift(db: AsyncSession) -> list[dict]:
+    rows = await db.execute(text(f"""
+        SELECT coalesce(a.scope, c.scope) AS scope, coalesce(a.owner, c.owner) AS owner,
+               coalesce(a.form_status, c.form_status) AS form_status,
+               coalesce(c.count, 0) AS counted, coalesce(a.count, 0) AS actual
+        FROM ({actual_counts_sql}) a
+        FULL OUTER JOIN form_counter c
+            ON c.scope = a.scope AND c.owner = a.owner AND c.form_status = a.form_status
+        WHERE coalesce(c.count, 0) <> coalesce(a.count, 0)
+    """))
+    return [dict(row) for row in rows.mappings()]
+
+
+async def rebuild(db: AsyncSession) -> list[dict]:
+    """ Recount every counter from the form table, return the drift that was corrected """
+    # blocks form writes until the rebuild commits, so no write is counted twice or missed
+    await db.execute(text("LOCK TABLE form IN SHARE MODE"))
+    drift = await find_drift(db)
+    await db.execute(text("DELETE FROM form_counter"))
+    await db.execute(text(f"INSERT INTO form_counter (scope, owner, form_status, count) {actual_counts_sql}"))
+    await db.commit()
+    return drift
+
+
+async def main(command: str):
+    async with AsyncSessionLocal() as db:
+        drift = await rebuild(db) if command == "rebuild" else await find_drift(db)
+
+    for row in drift:
+        print(f"drift: {row['scope']}/{row['owner']}/{row['form_status']} counted {row['counted']}, "
+              f"actual {row['actual']}")
+    print(f"form_counter: {len(drift)} drifted counters{' rebuilt' if command == 'rebuild' and drift else ''}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "check"))
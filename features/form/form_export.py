@@ -0,0 +1,120 @@
+import csv
+import enum
+import io
+from datetime import date, time, timedelta
+from typing import Annotated, AsyncIterator
+
+import orjson
+from fastapi import FastAPI, Depends, HTTPException, Request
+from sqlalchemy import select
+from starlette import status
+from starlette.responses import StreamingResponse
+
+from db import models
+from db.database import read_session
+from features.security.token import Token, validate_token
+
+"""
+Form export - every matching form streamed from a server-side cursor, as NDJSON (one form with its
+details per line) or CSV (one line per detail, the form columns repeated). Rows are fetched and written
+export_batch_size at a time, so memory stays flat however many forms are exported.
+"""
+
+export_batch_size = 1000
+
+form_columns = [models.Form.id, models.Form.form_type, models.Form.form_status, models.Form.form_phase,
+                models.Form.reason, models.FormReason.name.label("reason_name"), models.Form.productivity,
+                models.Form.department, models.Form.role, models.Form.created_user, models.Form.assigned_user,
+                models.Form.description, models.Form.note, models.Form.created, models.Form.last_updated]
+detail_columns = [models.FormDetail.id.label("detail_id"), models.FormDetail.from_date, models.FormDetail.to_date,
+                  models.FormDetail.from_time, models.FormDetail.to_time]
+form_keys = [column.key for column in form_columns]
+detail_keys = [column.key for column in detail_columns]
+
+export_formats = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, time)):  # datetime is a date
+        return value.isoformat()
+    return value
+
+
+def export_statement(created_from: date | None, created_to: date | None, department: str | None,
+                     form_status: str | None):
+    conditions = []
+    if created_from is not None:
+        conditions.append(models.Form.created >= created_from)
+    if created_to is not None:
+        conditions.append(models.Form.created < created_to + timedelta(days=1))
+    if department is not None:
+        conditions.append(models.Form.department == department)
+    if form_status is not None:
+        conditions.append(models.Form.form_status == form_status)
+
+    # details are joined in form order, so the lines of one form arrive together
+    return (select(*form_columns, *detail_columns)
+            .join(models.FormReason, models.FormReason.id == models.Form.reason)
+            .outerjoin(models.FormDetail, models.FormDetail.form == models.Form.id)
+            .where(*conditions)
+            .order_by(models.Form.id, models.FormDetail.id)
+            .execution_options(yield_per=export_batch_size))
+
+
+async def stream_rows(request: Request, statement) -> AsyncIterator[list]:
+    """ Batches of rows from a server-side cursor, on a session of its own that lives as long as the stream """
+    async with read_session(request) as db:
+        result = await db.stream(statement)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def ndjson_lines(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    form = None
+    async for rows in batches:
+        chunk = []
+        for row in rows:
+            if form is None or form["id"] != row.id:
+                if form is not None:
+                    chunk.append(orjson.dumps(form) + b"\n")
+                form = {key: export_value(getattr(row, key)) for key in form_keys}
+                form["details"] = []
+            if row.detail_id is not None:
+                form["details"].append({key.removeprefix("detail_"): export_value(getattr(row, key))
+                                        for key in detail_keys})
+        if chunk:
+            yield b"".join(chunk)
+    if form is not None:
+        yield orjson.dumps(form) + b"\n"
+
+
+async def csv_lines(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(form_keys + detail_keys)
+    async for rows in batches:
+        writer.writerows([export_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def route(app: FastAPI):
+    @app.get("/forms/export")
+    async def export(current_user: Annotated[Token, Depends(validate_token)], request: Request,
+                     format: str = "ndjson", created_from: date | None = None, created_to: date | None = None,
+                     department: str | None = None, form_status: str | None = None):
+        if format not in export_formats:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown format {format}, expected one of {sorted(export_formats)}")
+        if form_status is not None and form_status not in models.FormStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown form status {form_status}")
+
+        batches = stream_rows(request, export_statement(created_from, created_to, department, form_status))
+        return StreamingResponse(ndjson_lines(batches) if format == "ndjson" else csv_lines(batches),
+                                 media_type=export_formats[format],
+                                 headers={"Content-Disposition": f'attachment; filename="forms.{format}"'})
@@ -0,0 +1,36 @@
+from typing import Annotated
+
+from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models
+from db.database import get_read_db
+from features.form.form_controller import AllFormsResponse, all_forms_serializer, list_forms, status_conditions
+from features.security.token import Token, validate_token
+
+"""
+Approver inbox - forms created by anyone below the caller in the management hierarchy, not only the ones
+assigned to them. The team comes from the management_chain primary key, the forms from the created_user
+index, in the one query of list_forms.
+"""
+
+
+def route(app: FastAPI):
+    @app.get("/forms/inbox", response_model=AllFormsResponse)
+    async def inbox(current_user: Annotated[Token, Depends(validate_token)],
+                    db: Annotated[AsyncSession, Depends(get_read_db)],
+                    form_status: str = models.FormStatus.pending.name, max_depth: int | None = None,
+                    page: int = 0, page_size: int = 20, cursor: str | None = None, include_total: bool = True):
+        """ max_depth: 1 for the direct reports only, the whole subtree by default """
+        if form_status != "all" and form_status not in models.FormStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown form status {form_status}")
+
+        team = select(models.ManagementChain.member).where(models.ManagementChain.manager == current_user.username,
+                                                           models.ManagementChain.depth > 0)
+        if max_depth is not None:
+            team = team.where(models.ManagementChain.depth <= max_depth)
+        return all_forms_serializer.response(await list_forms(
+            db, [models.Form.created_user.in_(team), *status_conditions(form_status)], page, page_size, cursor,
+            include_total))
@@ -1,14 +1,18 @@
 from typing import Annotated
 
 from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
 
-from db import models, schemas
-from db.database import get_db
+from db import schemas
+from features.reference.reference_data import reference_data, reference_cacheable
 from features.security.token import Token, validate_token
+from utils.serializer import JsonSerializer
+
+
+form_reasons_serializer = JsonSerializer(list[schemas.FormReason])
 
 
 def route(app: FastAPI):
     @app.get("/form/reason", response_model=list[schemas.FormReason])
-    async def get_all(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.query(models.FormReason).all()
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      cache_headers: Annotated[dict, Depends(reference_cacheable)]):
+        return form_reasons_serializer.response(reference_data.snapshot.form_reasons, headers=cache_headers)
@@ -4,9 +4,11 @@ from fastapi import FastAPI, Depends
 
 from db import models
 from features.security.token import Token, validate_token
+from utils.etag import cacheable
 
 
 def route(app: FastAPI):
     @app.get("/form/type")
-    async def get_all(current_user: Annotated[Token, Depends(validate_token)]):
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      cache_headers: Annotated[dict, Depends(cacheable("private, max-age=3600"))]):
         return ({"name": e.name, "value": e.value} for e in models.FormType)
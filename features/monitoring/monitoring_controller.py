@@ -0,0 +1,35 @@
+from typing import Annotated
+
+from fastapi import FastAPI, Depends
+
+from db.database import async_engine, replica_engines, replica_hosts, recent_writers
+from db.pool import pool_status
+from features.reference.reference_data import reference_data
+from features.security.revocation import revocation_list
+from features.security.token import Token, validate_token, token_cache, stateless_validation
+from features.user_account.user_account_service import password_pool
+
+
+def route(app: FastAPI):
+    @app.get("/internal/stats/token-cache")
+    async def get_token_cache_stats(current_user: Annotated[Token, Depends(validate_token)]):
+        return token_cache.stats()
+
+    @app.get("/internal/stats/token-revocation")
+    async def get_token_revocation_stats(current_user: Annotated[Token, Depends(validate_token)]):
+        return {"stateless_validation": stateless_validation, **revocation_list.stats()}
+
+    @app.get("/internal/stats/password-hasher")
+    async def get_password_hasher_stats(current_user: Annotated[Token, Depends(validate_token)]):
+        return password_pool.stats()
+
+    @app.get("/internal/stats/db-pool")
+    async def get_db_pool_stats(current_user: Annotated[Token, Depends(validate_token)]):
+        return {"primary": pool_status(async_engine),
+                "replicas": {host: pool_status(replica_engine)
+                             for host, replica_engine in zip(replica_hosts, replica_engines)},
+                "read_your_writes": recent_writers.stats()}
+
+    @app.get("/internal/stats/reference-data")
+    async def get_reference_data_stats(current_user: Annotated[Token, Depends(validate_token)]):
+        return reference_data.stats()
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from db import models
+from db.database import AsyncSessionLocal
+from utils.etag import cacheable
+
+"""
+Reference data - form reasons, roles, permissions and departments kept in memory.
+Loaded at startup, reloaded after POST /role and POST /department, and periodically to pick up
+writes made by other workers. The version is bumped whenever a reload finds different data,
+content_hash identifies the data itself, so it is the same on every worker holding it (the ETag).
+"""
+
+
+class ReferenceSnapshot:
+    """ One consistent, read-only load of all reference tables """
+
+    def __init__(self, form_reasons: list = (), roles: list = (), permissions: list = (), departments: list = ()):
+        self.form_reasons = list(form_reasons)
+        self.roles = list(roles)
+        self.permissions = list(permissions)
+        self.departments = list(departments)
+        self.roles_by_name = {role.name: role for role in self.roles}
+        self.permissions_by_name = {permission.name: permission for permission in self.permissions}
+        self.departments_by_name = {department.name: department for department in self.departments}
+
+    def signature(self) -> tuple:
+        return (tuple(row_values(reason) for reason in self.form_reasons),
+                tuple((row_values(role), tuple(row_values(p) for p in role.permissions)) for role in self.roles),
+                tuple(row_values(permission) for permission in self.permissions),
+                tuple(row_values(department) for department in self.departments))
+
+
+def row_values(row: models.Base) -> tuple:
+    return tuple(getattr(row, column.key) for column in row.__table__.columns)
+
+
+class ReferenceDataCache:
+    def __init__(self):
+        self.snapshot = ReferenceSnapshot()
+        self.version = 0
+        self.content_hash = ""
+        self.loads = 0
+        self._signature = None
+        self._lock = asyncio.Lock()
+
+    async def reload(self) -> int:
+        """ Load every reference table from the primary and swap the snapshot in, return the version """
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                snapshot = ReferenceSnapshot(
+                    form_reasons=(await db.scalars(select(models.FormReason).order_by(models.FormReason.id))).all(),
+                    roles=(await db.scalars(select(models.Role).options(selectinload(models.Role.permissions))
+                                            .order_by(models.Role.id))).all(),
+                    permissions=(await db.scalars(select(models.Permission).order_by(models.Permission.id))).all(),
+                    departments=(await db.scalars(select(models.Department)
+                                                  .order_by(models.Department.name.desc()))).all())
+
+            signature = snapshot.signature()
+            if signature != self._signature:
+                self._signature = signature
+                self.version += 1
+                self.content_hash = hashlib.sha256(repr(signature).encode("utf-8")).hexdigest()[:32]
+            self.snapshot = snapshot
+            self.loads += 1
+            return self.version
+
+    async def reload_after_write(self):
+        """ Called once a write committed, a failed reload is left to the periodic refresh """
+        try:
+            await self.reload()
+        except Exception as e:
+            print(f"reload_after_write: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "loads": self.loads,
+            "form_reasons": len(self.snapshot.form_reasons),
+            "roles": len(self.snapshot.roles),
+            "permissions": len(self.snapshot.permissions),
+            "departments": len(self.snapshot.departments),
+        }
+
+
+reference_data = ReferenceDataCache()
+
+
+async def refresh_reference_data(interval: float):
+    """ Pick up reference data written by other workers """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reference_data.reload()
+        except Exception as e:
+            print(f"refresh_reference_data: {e}")
+
+
+# clients revalidate on every use, an unchanged content hash is answered with 304 before any work
+reference_cacheable = cacheable("private, no-cache", etag=lambda: reference_data.content_hash)
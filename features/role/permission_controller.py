@@ -1,19 +1,23 @@
 from typing import Annotated
 
 from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
 
-from db import models, schemas
-from db.database import get_db
+from db import schemas
+from features.reference.reference_data import reference_data, reference_cacheable
 from features.security.token import Token, validate_token
+from utils.serializer import JsonSerializer
+
+
+permissions_serializer = JsonSerializer(list[schemas.Permission])
 
 
 def route(app: FastAPI):
     @app.get("/permissions", response_model=list[schemas.Permission])
-    async def get_all(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.query(models.Permission).all()
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      cache_headers: Annotated[dict, Depends(reference_cacheable)]):
+        return permissions_serializer.response(reference_data.snapshot.permissions, headers=cache_headers)
 
     @app.get("/permissions/{permission_name}", response_model=schemas.Permission)
-    async def get(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
-                  permission_name: str):
-        return db.query(models.Permission).filter(models.Permission.name == permission_name).first()
+    async def get(current_user: Annotated[Token, Depends(validate_token)],
+                  cache_headers: Annotated[dict, Depends(reference_cacheable)], permission_name: str):
+        return reference_data.snapshot.permissions_by_name.get(permission_name)
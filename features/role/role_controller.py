@@ -2,11 +2,13 @@ from typing import Annotated
 
 from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import models, schemas
 from db.database import get_db
+from features.reference.reference_data import reference_data, reference_cacheable
 from features.security.token import Token, validate_token
+from utils.serializer import JsonSerializer
 
 
 class RoleRequest(BaseModel):
@@ -15,26 +17,32 @@ class RoleRequest(BaseModel):
     permissions: list[str]
 
 
+roles_serializer = JsonSerializer(list[schemas.Role])
+
+
 def route(app: FastAPI):
     @app.get("/roles", response_model=list[schemas.Role])
-    async def get_all(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.query(models.Role).all()
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      cache_headers: Annotated[dict, Depends(reference_cacheable)]):
+        return roles_serializer.response(reference_data.snapshot.roles, headers=cache_headers)
 
     @app.get("/role/{role_name}", response_model=schemas.Role | None)
-    async def get(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
-                  role_name: str):
-        return db.query(models.Role).filter(models.Role.name == role_name).first()
+    async def get(current_user: Annotated[Token, Depends(validate_token)],
+                  cache_headers: Annotated[dict, Depends(reference_cacheable)], role_name: str):
+        return reference_data.snapshot.roles_by_name.get(role_name)
 
     @app.post("/role", response_model=schemas.Role)
-    async def create(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def create(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
                      request: RoleRequest):
         try:
             role_permissions = [models.RolePermission(role=request.name, permission=r) for r in request.permissions]
             role = models.Role(name=request.name, description=request.description, permissions=role_permissions)
             db.add(role)
-            db.commit()
-            db.refresh(role)
+            await db.commit()
+            await db.refresh(role, ["permissions"])
+            await reference_data.reload_after_write()
             return role
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
@@ -0,0 +1,117 @@
+import re
+from typing import Annotated
+
+from fastapi import FastAPI, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, text, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models, schemas
+from db.database import get_read_db
+from features.form.form_controller import form_relationships
+from features.security.token import Token, validate_token
+from utils.serializer import JsonSerializer
+
+"""
+Search - forms by the words of their description and note (full text, every word matching as a prefix),
+users by a part of their name, username or email (trigram word similarity). Both sides go through
+immutable_unaccent, so "nguyen" finds "Nguyễn" and "đ" matches "d". The expressions are the ones of the
+GIN indexes of db/migrations/m0008_search_indexes.py, spelled the same so the planner uses them.
+"""
+
+max_search_page_size = 100
+
+
+def form_document_sql(alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return (f"to_tsvector('simple'::regconfig, immutable_unaccent("
+            f"coalesce({prefix}description, '') || ' ' || coalesce({prefix}note, '')))")
+
+
+def user_document_sql(alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return (f"lower(immutable_unaccent({prefix}firstname || ' ' || coalesce({prefix}middlename, '') || ' ' "
+            f"|| {prefix}lastname || ' ' || {prefix}username || ' ' || {prefix}email))")
+
+
+# the "simple" configuration does not stem, which suits vietnamese
+form_query_sql = "to_tsquery('simple'::regconfig, immutable_unaccent(:query))"
+user_query_sql = "lower(immutable_unaccent(:query))"
+
+
+def prefix_query(q: str) -> str | None:
+    """ Every word of q as a prefix, all of them required: "ngh phep" -> "ngh:* & phep:*" """
+    words = re.findall(r"\w+", q)
+    return " & ".join(f"{word}:*" for word in words) if words else None
+
+
+class FormSearchResponse(BaseModel):
+    data: list[schemas.Form] = []
+    next_page: int | None = None
+
+
+class UserSearchResponse(BaseModel):
+    data: list[schemas.UserAccount] = []
+    next_page: int | None = None
+
+
+form_search_serializer = JsonSerializer(FormSearchResponse)
+user_search_serializer = JsonSerializer(UserSearchResponse)
+
+
+def check_page(page: int, page_size: int):
+    if page < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="page must not be negative")
+    if not 1 <= page_size <= max_search_page_size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"page_size must be between 1 and {max_search_page_size}")
+
+
+def page_of(items: list, page: int, page_size: int) -> dict:
+    """ One more row than the page is fetched, its presence tells whether there is a next page """
+    return {"data": items[:page_size], "next_page": page + 1 if len(items) > page_size else None}
+
+
+def route(app: FastAPI):
+    @app.get("/search/forms", response_model=FormSearchResponse)
+    async def search_forms(current_user: Annotated[Token, Depends(validate_token)],
+                           db: Annotated[AsyncSession, Depends(get_read_db)],
+                           q: str, form_status: str = "all", page: int = 0, page_size: int = 20):
+        """ Best matches first, newest first among equal ones """
+        check_page(page, page_size)
+        if form_status != "all" and form_status not in models.FormStatus.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown form status {form_status}")
+        query = prefix_query(q)
+        if query is None:
+            return form_search_serializer.response(page_of([], page, page_size))
+
+        document, query = form_document_sql("form"), bindparam("query", query)
+        statement = (select(models.Form).options(*form_relationships)
+                     .where(text(f"{document} @@ {form_query_sql}").bindparams(query))
+                     .order_by(text(f"ts_rank({document}, {form_query_sql}) DESC").bindparams(query),
+                               models.Form.created.desc(), models.Form.id.desc())
+                     .offset(page * page_size).limit(page_size + 1))
+        if form_status != "all":
+            statement = statement.where(models.Form.form_status == form_status)
+        forms = (await db.scalars(statement)).all()
+        return form_search_serializer.response(page_of(forms, page, page_size))
+
+    @app.get("/search/users", response_model=UserSearchResponse)
+    async def search_users(current_user: Annotated[Token, Depends(validate_token)],
+                           db: Annotated[AsyncSession, Depends(get_read_db)],
+                           q: str, page: int = 0, page_size: int = 20):
+        """ Users that are not deleted, the most similar first """
+        check_page(page, page_size)
+        if not q.strip():
+            return user_search_serializer.response(page_of([], page, page_size))
+
+        document, query = user_document_sql("user_account"), bindparam("query", q.strip())
+        statement = (select(models.UserAccount)
+                     .where(text(f"{user_query_sql} <% {document}").bindparams(query),
+                            models.UserAccount.status != models.UserType.deleted)
+                     .order_by(text(f"word_similarity({user_query_sql}, {document}) DESC").bindparams(query),
+                               models.UserAccount.firstname, models.UserAccount.id)
+                     .offset(page * page_size).limit(page_size + 1))
+        users = (await db.scalars(statement)).all()
+        return user_search_serializer.response(page_of(users, page, page_size))
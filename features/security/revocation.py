@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import jwt
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import models
+from db.database import AsyncSessionLocal
+
+""" Revocation list - revoked token ids, lets tokens be validated without a database round trip """
+
+
+class RevocationList:
+    def __init__(self):
+        self._revoked: dict[str, datetime] = {}
+        # when each token was revoked by this worker, a reload must not drop the ones its query missed
+        self._added_at: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self.last_reloaded_at: datetime | None = None
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, token_id: str, expired_at: datetime):
+        with self._lock:
+            self._revoked[token_id] = expired_at
+            self._added_at[token_id] = datetime.now()
+
+    def replace(self, revoked: dict[str, datetime], started_at: datetime):
+        """ Swap in the revocations loaded by a query started at started_at, keeping the ones added since """
+        with self._lock:
+            self._added_at = {token_id: added_at for token_id, added_at in self._added_at.items()
+                              if added_at >= started_at}
+            for token_id in self._added_at:
+                revoked.setdefault(token_id, self._revoked[token_id])
+            self._revoked = revoked
+            self.last_reloaded_at = datetime.now()
+
+    def stats(self) -> dict:
+        return {"revoked_count": len(self), "last_reloaded_at": self.last_reloaded_at}
+
+
+revocation_list = RevocationList()
+
+
+def token_id_of(token: str) -> str | None:
+    """ Read the jti claim of a token issued by this service, signature is checked on validation only """
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("jti")
+    except jwt.PyJWTError:
+        return None
+
+
+def revoke_tokens(db: AsyncSession, user_tokens: list[models.UserToken]) -> list[models.RevokedToken]:
+    """ Record tokens as revoked in the current transaction, the caller commits """
+    revoked_tokens = []
+    for user_token in user_tokens:
+        token_id = token_id_of(user_token.token)
+        if token_id is not None:
+            revoked_tokens.append(models.RevokedToken(id=token_id, username=user_token.username,
+                                                      expired_at=user_token.expired_at))
+    db.add_all(revoked_tokens)
+    return revoked_tokens
+
+
+async def reload_revoked_tokens():
+    """ Replace the in-memory list with unexpired revocations from the database, pruning expired ones """
+    started_at = datetime.now()
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.RevokedToken).where(models.RevokedToken.expired_at < datetime.now()))
+        rows = (await db.execute(select(models.RevokedToken.id, models.RevokedToken.expired_at))).all()
+        await db.commit()
+    revocation_list.replace({row.id: row.expired_at for row in rows}, started_at)
+
+
+async def refresh_revoked_tokens(interval: float):
+    """ Keep the list in sync with revocations made by other workers """
+    while True:
+        try:
+            await reload_revoked_tokens()
+        except Exception as e:
+            print(f"refresh_revoked_tokens: {e}")
+        await asyncio.sleep(interval)
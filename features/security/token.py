@@ -1,4 +1,5 @@
 import os
+import uuid
 from datetime import datetime
 from typing import Annotated
 
@@ -6,11 +7,14 @@ import jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import ValidationError, BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing_extensions import Any
 
 from db import models
 from db.database import get_db
+from features.security.revocation import revocation_list
+from utils.ttl_cache import TTLCache
 
 """ Auth Token - Token for authenticate on using Application """
 
@@ -25,6 +29,7 @@ class Token(BaseModel):
     middlename: str | None = None
     email: str
     expired_at: datetime
+    jti: str | None = None
 
     def __init__(self, /, **data: Any):
         super().__init__(**data)
@@ -38,6 +43,7 @@ class Token(BaseModel):
         self.email = data.get("email")
         self.expired_at = datetime.fromisoformat(data.get("expired_at")) if isinstance(data.get("expired_at"),
                                                                                        str) else data.get("expired_at")
+        self.jti = data.get("jti")
 
     def to_serializable_dict(self):
         # Convert object to a dict that can be serialized to JSON
@@ -50,12 +56,39 @@ class Token(BaseModel):
             'lastname': self.lastname,
             'middlename': self.middlename,
             'email': self.email,
-            'expired_at': self.expired_at.isoformat()
+            'expired_at': self.expired_at.isoformat(),
+            'jti': self.jti
         }
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# validated tokens, keyed by the raw token string - lets repeated requests skip the user_token lookup
+token_cache = TTLCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+                       ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 60)))
+
+
+# "stateless" trusts the signature and expired_at claim, revocations come from the in-memory revocation list
+stateless_validation = os.getenv("TOKEN_VALIDATION_MODE", "database") == "stateless"
+
+
+def invalidate_user_tokens(username: str, revoked_tokens: list[models.RevokedToken] = ()):
+    """ Drop cached tokens of a user, must be called whenever its user_token rows are removed """
+    token_cache.discard_where(lambda _, cached: cached.username == username)
+    for revoked_token in revoked_tokens:
+        revocation_list.add(revoked_token.id, revoked_token.expired_at)
+
+
+def validate_claims(payload: dict) -> Token:
+    validated_token = Token(**payload)
+    if validated_token.expired_at < datetime.now():
+        raise HTTPException(status_code=403, detail="Token expired")
+
+    if validated_token.jti in revocation_list:
+        raise HTTPException(status_code=403, detail="Token has been revoked")
+
+    return validated_token
+
 
 def generate_token(user: models.UserAccount, expired_at: datetime) -> str:
     # init basic token info
@@ -68,20 +101,30 @@ def generate_token(user: models.UserAccount, expired_at: datetime) -> str:
         'lastname': user.lastname,
         'middlename': user.middlename,
         'email': user.email,
-        'expired_at': expired_at})
+        'expired_at': expired_at,
+        'jti': uuid.uuid4().hex})
     encoded_jwt = jwt.encode(token.to_serializable_dict(), os.getenv("SECRET_KEY"),
                              algorithm=os.getenv("SECURITY_ALGORITHM"))
     return encoded_jwt
 
 
-async def validate_token(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+async def validate_token(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_db)):
+    cached_token = token_cache.get(token)
+    if cached_token is not None:
+        return cached_token
+
     try:
         # Decode JWT token to get user object
         payload = jwt.decode(token,
                              os.getenv("SECRET_KEY"),
                              algorithms=[os.getenv("SECURITY_ALGORITHM")])
 
-        user_token = db.query(models.UserToken).filter(models.UserToken.username == payload.get("username")).first()
+        # tokens issued before jti existed can not be revoked by id, they are still checked against user_token
+        if stateless_validation and payload.get("jti"):
+            return validate_claims(payload)
+
+        user_token = (await db.scalars(select(models.UserToken)
+                                       .where(models.UserToken.username == payload.get("username")))).first()
         if user_token is None:
             raise HTTPException(status_code=403, detail="User does not exist")
 
@@ -94,14 +137,19 @@ async def validate_token(token: Annotated[str, Depends(oauth2_scheme)], db: Sess
             errMsg = "User does not exist"
 
         if errMsg:
-            db.delete(user_token)
-            db.commit()
+            await db.delete(user_token)
+            await db.commit()
+            invalidate_user_tokens(user_token.username)
             raise HTTPException(status_code=403, detail=f"{errMsg}")
 
-        db.commit()
-        return Token(**payload)
+        await db.commit()
+
+        # cache until the token expires, at most for the cache ttl
+        validated_token = Token(**payload)
+        token_cache.set(token, validated_token, ttl=(user_token.expired_at - datetime.now()).total_seconds())
+        return validated_token
     except (jwt.PyJWTError, ValidationError) as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=403,
             detail=e.__str__()
@@ -0,0 +1,74 @@
+from fastapi import HTTPException
+from sqlalchemy import select, text, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db import models
+
+"""
+Management hierarchy - the management_chain closure table over user_account.line_manager. Every user has a row
+with themselves, and one with each manager above them, so the whole subtree below a manager is one primary
+key range. Moving a user moves their subtree: the links from the old managers above are deleted and the
+links from the new ones inserted, no other row changes.
+"""
+
+# any constant, identifies the advisory lock serializing hierarchy changes, two concurrent moves
+# could otherwise each pass the cycle check and close a cycle together
+HIERARCHY_LOCK_ID = 7_246_002
+
+# the old managers above username lose the subtree of username
+detach_sql = """
+    DELETE FROM management_chain link
+    USING management_chain above, management_chain below
+    WHERE above.member = :username AND above.depth > 0 AND below.manager = :username
+      AND link.manager = above.manager AND link.member = below.member
+"""
+
+# line_manager and everyone above them gain the subtree of username
+attach_sql = """
+    INSERT INTO management_chain (manager, member, depth)
+    SELECT above.manager, below.member, above.depth + below.depth + 1
+    FROM management_chain above, management_chain below
+    WHERE above.member = :line_manager AND below.manager = :username
+"""
+
+
+async def is_below(db: AsyncSession, username: str, manager: str) -> bool:
+    return await db.scalar(select(exists().where(models.ManagementChain.manager == manager,
+                                                 models.ManagementChain.member == username)))
+
+
+async def set_line_manager(db: AsyncSession, username: str, line_manager: str | None):
+    """ Move username with everyone below them under line_manager, the caller commits """
+    await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": HIERARCHY_LOCK_ID})
+    if line_manager is not None:
+        if await db.scalar(select(models.UserAccount.id).where(models.UserAccount.username == line_manager)) is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown line manager {line_manager}")
+        if line_manager == username or await is_below(db, line_manager, username):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"{line_manager} as line manager of {username} would make a cycle")
+
+    await db.execute(insert(models.ManagementChain).values(manager=username, member=username, depth=0)
+                     .on_conflict_do_nothing())
+    await db.execute(text(detach_sql), {"username": username})
+    if line_manager is not None:
+        await db.execute(text(attach_sql), {"username": username, "line_manager": line_manager})
+
+
+async def add_user(db: AsyncSession, user: models.UserAccount):
+    """
+    Link a new user under their line manager when known, and the users already naming them as line manager
+    below them. A user that would close a cycle stays where they are.
+    """
+    known_manager = user.line_manager not in (None, user.username) and await db.scalar(
+        select(models.UserAccount.id).where(models.UserAccount.username == user.line_manager)) is not None
+    await set_line_manager(db, user.username, user.line_manager if known_manager else None)
+
+    reports = (await db.scalars(select(models.UserAccount.username)
+                                .where(models.UserAccount.line_manager == user.username,
+                                       models.UserAccount.username != user.username))).all()
+    for report in reports:
+        if not await is_below(db, user.username, report):
+            await set_line_manager(db, report, user.username)
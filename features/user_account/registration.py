@@ -6,13 +6,14 @@ from typing import Annotated
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, UploadFile
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from config import as_form
 from db import models
 from db.database import get_db
-from features.user_account import user_account_service
+from features.user_account import user_account_service, hierarchy
 from features.user_account.user_account_service import encrypt_password, register_identity_with_service, \
     confirm_registration
 
@@ -389,18 +390,19 @@ mail_body = """
 
 def route(app: FastAPI):
     @app.post("/register", status_code=HTTPStatus.CREATED)
-    async def register(db: Annotated[Session, Depends(get_db)], background_tasks: BackgroundTasks,
+    async def register(db: Annotated[AsyncSession, Depends(get_db)], background_tasks: BackgroundTasks,
                        request: UserAccountRequest):
         try:
             # create account
             images = request.images
             request.__delattr__('images')
-            request.password = encrypt_password(request.password)
+            request.password = await encrypt_password(request.password)
             user_account = models.UserAccount(**request.model_dump())
             user_account.department = 'IT Department'
             user_account.role = 'developer'
             db.add(user_account)
-            db.flush()
+            await db.flush()
+            await hierarchy.add_user(db, user_account)
 
             # create otp to active account
             otp = random.randint(1000, 9999)
@@ -413,7 +415,7 @@ def route(app: FastAPI):
                                               user_account_service.extract_based64_encoded_images(request.username, images)
                                               )
 
-            db.commit()
+            await db.commit()
 
             # send mail
             background_tasks.add_task(confirm_registration, subject=os.getenv("MAIL_SUBJECT"), body=mail_body,
@@ -422,16 +424,17 @@ def route(app: FastAPI):
 
             return {"message": "Registered successfully"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             print("register: " + f"{e}")
             raise HTTPException(status_code=400, detail=f"{e}")
 
     @app.get("/resend-email/{username}")
-    async def resend_email(db: Annotated[Session, Depends(get_db)], background_tasks: BackgroundTasks,
+    async def resend_email(db: Annotated[AsyncSession, Depends(get_db)], background_tasks: BackgroundTasks,
                            username: str):
         try:
-            active_user = db.query(models.ActiveUser).filter(models.ActiveUser.username == username,
-                                                             models.ActiveUser.status != models.ActiveUserType.active) \
+            active_user = (await db.scalars(select(models.ActiveUser)
+                                            .where(models.ActiveUser.username == username,
+                                                   models.ActiveUser.status != models.ActiveUserType.active))) \
                 .first()
             active_user.otp = random.randint(1000, 9999)
             background_tasks.add_task(confirm_registration, subject=os.getenv("MAIL_SUBJECT"),
@@ -441,21 +444,23 @@ def route(app: FastAPI):
                                       otp=active_user.otp
                                       )
 
-            db.commit()
+            await db.commit()
             return {"message": "Resend email successfully"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
 
     @app.get("/active_user/{username}/{otp}")
-    def active_user(db: Annotated[Session, Depends(get_db)], background_tasks: BackgroundTasks, username: str,
-                    otp: int):
+    async def active_user(db: Annotated[AsyncSession, Depends(get_db)], background_tasks: BackgroundTasks,
+                          username: str, otp: int):
         try:
             err_msg = ""
-            user_account = db.query(models.UserAccount).filter(models.UserAccount.username == username).first()
-            active_user = (db.query(models.ActiveUser).filter(models.ActiveUser.username == username,
-                                                              models.ActiveUser.status == models.ActiveUserType.pending) \
-                           .first())
+            user_account = (await db.scalars(select(models.UserAccount)
+                                             .where(models.UserAccount.username == username))).first()
+            active_user = (await db.scalars(select(models.ActiveUser)
+                                            .where(models.ActiveUser.username == username,
+                                                   models.ActiveUser.status == models.ActiveUserType.pending))) \
+                .first()
 
             # check null - user not fount
             if active_user is None:
@@ -482,15 +487,18 @@ def route(app: FastAPI):
                 active_user.status = models.ActiveUserType.active
                 user_account.status = models.UserType.active
 
-            db.commit()
+            await db.commit()
+            if user_account is not None:
+                user_account_service.invalidate_profile(user_account.id)
 
             if err_msg:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err_msg)
             else:
-                db.refresh(user_account)
+                await db.refresh(user_account)
 
                 # fetch all images of activated user to register to third-party
-                user_images = db.query(models.UserImage).filter(models.UserImage.username == username).all()
+                user_images = (await db.scalars(select(models.UserImage)
+                                                .where(models.UserImage.username == username))).all()
 
                 # register face image with identified data at third-party
                 background_tasks.add_task(register_identity_with_service, user_account=user_account,
@@ -499,5 +507,5 @@ def route(app: FastAPI):
 
                 return {"message": "Activated account successfully"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
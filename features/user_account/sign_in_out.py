@@ -3,12 +3,14 @@ from typing import Annotated
 
 from fastapi import FastAPI, status, HTTPException, Depends, UploadFile, Form
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import schemas, models
 from db.database import get_db
 from db.models import UserToken, UserAccount
-from features.security.token import Token, validate_token, generate_token
+from features.security.revocation import revoke_tokens
+from features.security.token import Token, validate_token, generate_token, invalidate_user_tokens
 from features.user_account import user_account_service
 from features.user_account.user_account_service import check_password
 
@@ -25,27 +27,30 @@ class LogoutRequest(BaseModel):
 
 def route(app: FastAPI):
     @app.post("/login", response_model=schemas.UserToken | dict)
-    async def login(db: Annotated[Session, Depends(get_db)], user: LoginRequest):
+    async def login(db: Annotated[AsyncSession, Depends(get_db)], user: LoginRequest):
         try:
-            user_account = db.query(UserAccount).filter(UserAccount.username == user.username,
-                                                        UserAccount.status == models.UserType.active) \
+            user_account = (await db.scalars(select(UserAccount)
+                                             .where(UserAccount.username == user.username,
+                                                    UserAccount.status == models.UserType.active))) \
                 .first()
 
             if user_account is not None:
-                if not check_password(user.password, user_account.password):
+                if not await check_password(user.password, user_account.password):
                     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                         detail="Username or Password is incorrect")
 
                 # check if user is enabled 2 verification or not
                 # if enabled, return nothing, returned token will be depended on login_by_face
                 if user_account.enable_2_verification:
-                    images_count = db.query(models.UserImage).filter(models.UserImage.username == user_account.username).count()
+                    images_count = await db.scalar(select(func.count()).select_from(models.UserImage)
+                                                   .where(models.UserImage.username == user_account.username))
                     if images_count > 0:
                         return {}
 
                 # fetch current token if existed
-                user_token = db.query(UserToken).filter(UserToken.username == user.username,
-                                                        UserToken.expired_at > datetime.now()) \
+                user_token = (await db.scalars(select(UserToken)
+                                               .where(UserToken.username == user.username,
+                                                      UserToken.expired_at > datetime.now()))) \
                     .first()
                 if user_token is not None:
                     return user_token
@@ -55,25 +60,26 @@ def route(app: FastAPI):
                 token = generate_token(user_account, expire_time)
                 user_token = UserToken(username=user.username, token=token, expired_at=expire_time)
                 db.add(user_token)
-                db.commit()
-                db.refresh(user_token)
+                await db.commit()
+                await db.refresh(user_token)
                 return user_token
             else:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username or Password is incorrect")
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
 
     @app.post("/login/face", response_model=schemas.UserToken)
-    async def login_by_identification(db: Annotated[Session, Depends(get_db)], username: Annotated[str, Form()],
+    async def login_by_identification(db: Annotated[AsyncSession, Depends(get_db)], username: Annotated[str, Form()],
                                       face_image: UploadFile):
         response_identity = await user_account_service.identity_with_service(username, face_image)
         if response_identity is None:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Face identification is incorrect")
 
         try:
-            user_account = db.query(UserAccount).filter(UserAccount.username == username,
-                                                        UserAccount.status == models.UserType.active) \
+            user_account = (await db.scalars(select(UserAccount)
+                                             .where(UserAccount.username == username,
+                                                    UserAccount.status == models.UserType.active))) \
                 .first()
 
             verified_user = response_identity.get("identification_id")
@@ -81,8 +87,9 @@ def route(app: FastAPI):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Face identification is incorrect")
 
             # fetch current token if existed
-            user_token = db.query(UserToken).filter(UserToken.username == user_account.username,
-                                                    UserToken.expired_at > datetime.now()) \
+            user_token = (await db.scalars(select(UserToken)
+                                           .where(UserToken.username == user_account.username,
+                                                  UserToken.expired_at > datetime.now()))) \
                 .first()
             if user_token is not None:
                 return user_token
@@ -92,21 +99,25 @@ def route(app: FastAPI):
             token = generate_token(user_account, expire_time)
             user_token = UserToken(username=user_account.username, token=token, expired_at=expire_time)
             db.add(user_token)
-            db.commit()
-            db.refresh(user_token)
+            await db.commit()
+            await db.refresh(user_token)
             return user_token
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
 
     @app.post("/logout")
-    async def logout(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
+    async def logout(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)]):
         try:
             # delete user token
-            user_token = db.query(UserToken).filter(UserToken.username == current_user.username).first()
-            db.delete(user_token)
-            db.commit()
+            user_token = (await db.scalars(select(UserToken)
+                                           .where(UserToken.username == current_user.username))).first()
+            revoked_tokens = revoke_tokens(db, [user_token])
+            await db.delete(user_token)
+            await db.commit()
+            invalidate_user_tokens(current_user.username, revoked_tokens)
             return {"message": "Logout successful"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
@@ -1,18 +1,23 @@
 import re
 from http.client import HTTPException
-from typing import Annotated
+from typing import Annotated, Any
 
 from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
 from pydantic import BaseModel
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from starlette.responses import Response
 
 from db import models, schemas
-from db.database import get_db
-from features.security.token import Token, validate_token
-from features.user_account import user_account_service
+from db.database import get_db, get_read_db
+from features.security.revocation import revoke_tokens
+from features.security.token import Token, validate_token, invalidate_user_tokens
+from features.user_account import user_account_service, hierarchy
 from features.user_account.user_account_service import encrypt_password
+from utils.cursor import encode_cursor, decode_cursor
+from utils.etag import cacheable
+from utils.serializer import JsonSerializer
 
 
 class UpdateUserImageRequest(BaseModel):
@@ -45,22 +50,74 @@ class UserAccount(BaseModel):
     deleted_images: list[DeleteUserImageRequest] | None = None
 
 
+users_serializer = JsonSerializer(list[schemas.UserAccount])
+projected_users_serializer = JsonSerializer(list[dict[str, Any]])
+max_users_page_size = 1000
+max_user_id = 2 ** 31 - 1
+
+
+def lookup_key(data: str) -> tuple[str, int | str]:
+    # an all digits value beyond the integer id range can only be an identity number
+    if data.isdigit() and int(data) <= max_user_id:
+        return "id", int(data)
+    if re.search(r'^[\w\.-]+@[a-zA-Z0-9-]+\.[a-zA-Z]{2,}$', data):
+        return "email", data
+    return "identity", data
+
+
+async def list_users(db: AsyncSession, conditions: list, fields: list[str] | None, page_size: int,
+                     cursor: str | None) -> Response:
+    """
+    Users by firstname descending, id breaking ties, one page at a time: the cursor holds the (firstname, id)
+    of the last returned user and is sent back in the X-Next-Cursor header, so the body stays a plain list.
+    With fields only those columns are selected.
+    """
+    columns = [getattr(models.UserAccount, field) for field in fields] if fields else [models.UserAccount]
+    statement = (select(*columns, models.UserAccount.firstname.label("cursor_firstname"),
+                        models.UserAccount.id.label("cursor_id"))
+                 .where(*conditions)
+                 .order_by(models.UserAccount.firstname.desc(), models.UserAccount.id.desc())
+                 .limit(page_size))
+    if cursor is not None:
+        firstname, user_id = decode_cursor(cursor, str, int)
+        statement = statement.where(tuple_(models.UserAccount.firstname, models.UserAccount.id)
+                                    < tuple_(firstname, user_id))
+
+    rows = (await db.execute(statement)).all()
+    headers = {}
+    if len(rows) == page_size:
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].cursor_firstname, rows[-1].cursor_id)
+    if fields:
+        return projected_users_serializer.response([{field: getattr(row, field) for field in fields} for row in rows],
+                                                   headers=headers)
+    return users_serializer.response([row[0] for row in rows], headers=headers)
+
+
 def route(app: FastAPI):
     @app.post("/me", response_model=schemas.UserAccount)
-    async def me(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.get_one(models.UserAccount, current_user.user_id)
+    @app.get("/me", response_model=schemas.UserAccount)
+    async def me(current_user: Annotated[Token, Depends(validate_token)],
+                 cache_headers: Annotated[dict, Depends(cacheable("private, no-cache"))],
+                 db: Annotated[AsyncSession, Depends(get_db)]):
+        profile = await user_account_service.find_profile(db, "id", current_user.user_id)
+        if profile is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User does not exist")
+        return profile
 
     @app.get("/user/images/count")
-    async def get_images(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return {"image_count": db.query(models.UserImage).filter(models.UserImage.username == current_user.username).count()}
+    async def get_images(current_user: Annotated[Token, Depends(validate_token)],
+                         db: Annotated[AsyncSession, Depends(get_read_db)]):
+        return {"image_count": await db.scalar(select(func.count()).select_from(models.UserImage)
+                                               .where(models.UserImage.username == current_user.username))}
 
     @app.get("/user/images", response_model=list[schemas.UserImage])
     async def get_images(current_user: Annotated[Token, Depends(validate_token)],
-                         db: Annotated[Session, Depends(get_db)]):
+                         db: Annotated[AsyncSession, Depends(get_read_db)]):
         # fetch images from provider
         service_images = user_account_service.get_identity_images_with_service(current_user.username)
 
-        user_images = db.query(models.UserImage).filter(models.UserImage.username == current_user.username).all()
+        user_images = (await db.scalars(select(models.UserImage)
+                                        .where(models.UserImage.username == current_user.username))).all()
         for user_image in user_images:
             user_image.image = user_account_service.image_to_base64_png(user_image.image, user_image.image_type)
             if service_images is not None:
@@ -71,21 +128,39 @@ def route(app: FastAPI):
         return user_images
 
     @app.get("/user/{data}", response_model=schemas.UserAccount | None)
-    async def get(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def get(current_user: Annotated[Token, Depends(validate_token)],
+                  db: Annotated[AsyncSession, Depends(get_db)],
                   data: str):
-        # accept id, email or identity to find identified user
-        id = int(data) if data.isdigit() else None
-        email = data if re.search(r'^[\w\.-]+@[a-zA-Z0-9-]+\.[a-zA-Z]{2,}$', data) else None
-        identity = data if id is None and email is None else None
-        return db.query(models.UserAccount).filter(or_(models.UserAccount.id == id, models.UserAccount.email == email,
-                                                       models.UserAccount.identity == identity)).first()
+        # accept id, email or identity to find identified user, each one looked up by its own unique index.
+        # Read from the primary like /me: a miss fills the shared cache, a lagging replica would put back
+        # the row invalidate_profile just dropped
+        return await user_account_service.find_profile(db, *lookup_key(data))
 
     @app.get("/users", response_model=list[schemas.UserAccount])
-    async def get_all(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)]):
-        return db.query(models.UserAccount).order_by(models.UserAccount.firstname.desc()).all()
+    async def get_all(current_user: Annotated[Token, Depends(validate_token)],
+                      db: Annotated[AsyncSession, Depends(get_read_db)],
+                      department: str | None = None, role: str | None = None, status: str | None = None,
+                      fields: str | None = None, page_size: int = 100, cursor: str | None = None):
+        """ fields: comma separated schemas.UserAccount fields to return, all of them by default """
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        unknown_fields = set(selected_fields or ()) - schemas.UserAccount.model_fields.keys()
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {sorted(unknown_fields)}")
+        if status is not None and status not in models.UserType.__members__:
+            raise HTTPException(status_code=400, detail=f"Unknown status {status}")
+        if not 1 <= page_size <= max_users_page_size:
+            raise HTTPException(status_code=400,
+                                detail=f"page_size must be between 1 and {max_users_page_size}")
+
+        conditions = [condition for value, condition in (
+            (department, models.UserAccount.department == department),
+            (role, models.UserAccount.role == role),
+            (status, models.UserAccount.status == status)) if value is not None]
+        return await list_users(db, conditions, selected_fields, page_size, cursor)
 
     @app.put("/user", response_model=schemas.UserAccount)
-    async def update(current_user: Annotated[Token, Depends(validate_token)], db: Annotated[Session, Depends(get_db)],
+    async def update(current_user: Annotated[Token, Depends(validate_token)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
                      background_tasks: BackgroundTasks,
                      request: UserAccount):
         try:
@@ -95,11 +170,14 @@ def route(app: FastAPI):
             request.__delattr__("deleted_images")
 
             # accept id, email or identity to find identified user
-            user = db.get_one(models.UserAccount, current_user.user_id)
+            user = await db.get_one(models.UserAccount, current_user.user_id)
+            line_manager_before = user.line_manager
             for var, value in vars(request).items():
                 if var == "password" and value:
-                    value = encrypt_password(str(value))
+                    value = await encrypt_password(str(value))
                 setattr(user, var, value) if value is not None else None
+            if user.line_manager != line_manager_before:
+                await hierarchy.set_line_manager(db, user.username, user.line_manager)
 
             # store images
             if updated_images is not None and len(updated_images) > 0:
@@ -116,7 +194,7 @@ def route(app: FastAPI):
 
                 for image in updated_images:
                     if image["id"] is not None:
-                        user_image = db.get_one(models.UserImage, image["id"])
+                        user_image = await db.get_one(models.UserImage, image["id"])
                         image["content"]["filename"] = user_image.image
                         user_account_service.update_image(image["content"])
                     else:
@@ -134,8 +212,8 @@ def route(app: FastAPI):
                 for image in deleted_images:
                     if image is not None:
                         # fetch all images of deleted user
-                        deleted_image = db.get_one(models.UserImage, image.id)
-                        db.delete(deleted_image)
+                        deleted_image = await db.get_one(models.UserImage, image.id)
+                        await db.delete(deleted_image)
                         user_account_service.delete_image(image_name=deleted_image.image)
 
                 # delete face image with identified data at third-party
@@ -148,42 +226,48 @@ def route(app: FastAPI):
                                           retry_count=0)
                 # user_account_service.update_identity_with_service(user_account = user, images = deleted_images, retry_count = 0)
 
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            user_account_service.invalidate_profile(user.id)
+            await db.refresh(user)
 
             return user
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
 
     @app.delete("/user/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
     async def delete(current_user: Annotated[Token, Depends(validate_token)],
                      background_tasks: BackgroundTasks,
-                     db: Annotated[Session, Depends(get_db)],
+                     db: Annotated[AsyncSession, Depends(get_db)],
                      user_id: int):
         try:
             # fetch user is deleted
-            deleted_user = db.get_one(models.UserAccount, user_id)
+            deleted_user = await db.get_one(models.UserAccount, user_id)
             deleted_user.status = models.UserType.deleted
 
             # fetch all images of deleted user
-            deleted_images = db.query(models.UserImage).filter(models.UserImage.username == deleted_user.username).all()
+            deleted_images = (await db.scalars(select(models.UserImage)
+                                               .where(models.UserImage.username == deleted_user.username))).all()
 
             # delete images
             user_account_service.delete_images(deleted_images)
             # delete images in db
             for deleted_image in deleted_images:
-                db.delete(deleted_image)
+                await db.delete(deleted_image)
 
             # delete tokens
-            user_tokens = db.query(models.UserToken).filter(models.UserToken.username == deleted_user.username).all()
+            user_tokens = (await db.scalars(select(models.UserToken)
+                                            .where(models.UserToken.username == deleted_user.username))).all()
+            revoked_tokens = revoke_tokens(db, user_tokens)
             for token in user_tokens:
-                db.delete(token)
+                await db.delete(token)
 
             background_tasks.add_task(user_account_service.delete_identity_with_service, user_account=deleted_user)
 
-            db.commit()
+            await db.commit()
+            invalidate_user_tokens(deleted_user.username, revoked_tokens)
+            user_account_service.invalidate_profile(deleted_user.id)
             return {"message": "User is deleted"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=400, detail=f"{e}")
@@ -11,24 +11,63 @@ import bcrypt
 import requests
 from fastapi import UploadFile
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import models
+from db import models, schemas
+from utils.ttl_cache import TTLCache
+from utils.worker_pool import WorkerPool
 
 path = "resources/images"
 
+# bcrypt cost factor, each extra round doubles hashing time
+bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# bcrypt releases the GIL, threads are enough unless hashing competes with other CPU-bound work
+password_pool = WorkerPool(name="password-hasher",
+                           max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", 4)),
+                           max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 100)),
+                           use_processes=os.getenv("PASSWORD_HASH_EXECUTOR", "thread") == "process")
+
+# profiles served by /me and /user/{data}, keyed by (lookup column, value). Writers of a user_account row
+# call invalidate_profile, other workers see the change once the entry expires. Only fill it from primary
+# reads, a replica read could cache the row as it was before the invalidation
+profile_cache = TTLCache(max_size=int(os.getenv("PROFILE_CACHE_SIZE", 10000)),
+                         ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 30)))
+
+
+def invalidate_profile(user_id: int):
+    profile_cache.discard_where(lambda key, profile: profile.id == user_id)
+
+
+async def find_profile(db: AsyncSession, column: str, value: int | str) -> schemas.UserAccount | None:
+    """ User by id, email or identity, each one a unique index; unknown users are not cached """
+    profile = profile_cache.get((column, value))
+    if profile is None:
+        if column == "id":
+            user = await db.get(models.UserAccount, value)
+        else:
+            user = (await db.scalars(select(models.UserAccount)
+                                     .where(getattr(models.UserAccount, column) == value))).first()
+        if user is None:
+            return None
+        profile = schemas.UserAccount.model_validate(user, from_attributes=True)
+        profile_cache.set((column, value), profile)
+    return profile
+
 
 def image_to_base64_png(image_path: str, image_type: str) -> str:
     with open(f"{path}/{image_path}", "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
-def encrypt_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def encrypt_password(password: str) -> str:
+    hashed_password = await password_pool.run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds))
+    return hashed_password.decode('utf-8')
 
 
-def check_password(password: str, encrypted_password: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), encrypted_password.encode('utf-8'))
+async def check_password(password: str, encrypted_password: str) -> bool:
+    return await password_pool.run(bcrypt.checkpw, password.encode('utf-8'), encrypted_password.encode('utf-8'))
 
 
 def extract_based64_encoded_image(username: str, encoded_image: str):
@@ -231,7 +270,7 @@ def delete_image(fullpath_image: str | None = None, image_name: str | None = Non
             os.remove(fullpath_image)
 
 
-def store_image(dbConnection: Session, username: str, image=None):
+def store_image(dbConnection: AsyncSession, username: str, image=None):
     if image is None:
         return
 
@@ -247,7 +286,7 @@ def store_image(dbConnection: Session, username: str, image=None):
                          image_type=image["image_content_type"]))
 
 
-def store_images(dbConnection: Session, username: str, images: list | None = None):
+def store_images(dbConnection: AsyncSession, username: str, images: list | None = None):
     if images is None or len(images) == 0:
         return
 
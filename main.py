@@ -1,29 +1,57 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.encoders import jsonable_encoder
 from starlette import status
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
 from utils import file_helper
+from utils.etag import ETagMiddleware, NotModified, not_modified_response
 
 import router
-from db import models
-from db.database import engine
+from db.database import async_engine, replica_engines
+from features.reference.reference_data import reference_data, refresh_reference_data
+from features.security import revocation
+from features.security.token import stateless_validation
+from features.user_account.user_account_service import password_pool
 
 load_dotenv()                   # load config file
 file_helper.create_folder("")   # init folder resource/images
+# the schema is managed by migrations: run "python -m db.migration upgrade" before starting the app
 
-models.Base.metadata.create_all(bind=engine)
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await reference_data.reload()
+    background_tasks = [asyncio.create_task(
+        refresh_reference_data(float(os.getenv("REFERENCE_DATA_REFRESH_SECONDS", 300))))]
+    if stateless_validation:
+        background_tasks.append(asyncio.create_task(
+            revocation.refresh_revoked_tokens(float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", 30)))))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    password_pool.shutdown()
+    await async_engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+
+
+# orjson renders every response body that routes do not serialize themselves
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(ETagMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 router.route_all(app)
@@ -37,6 +65,11 @@ async def http_exception_handler(request: Request, e: HTTPException):
     )
 
 
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, e: NotModified):
+    return not_modified_response(e)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, e: Exception):
     return JSONResponse(
@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 
 from features.department import department_controller
-from features.form import form_controller, form_reason, form_type
+from features.form import form_controller, form_reason, form_type, form_bulk, form_export, form_conflict, form_inbox, \
+    attendance
+from features.monitoring import monitoring_controller
 from features.role import role_controller, permission_controller
+from features.search import search_controller
 from features.user_account import user_account_controller, registration, sign_in_out
 
 
@@ -22,4 +25,16 @@ def route_all(app: FastAPI):
     # form
     form_reason.route(app)
     form_type.route(app)
+    # before form_controller, whose "/forms/{form_status}" would take "export", "conflicts" and "inbox" as statuses
+    form_export.route(app)
+    form_conflict.route(app)
+    form_inbox.route(app)
     form_controller.route(app)
+    form_bulk.route(app)
+    attendance.route(app)
+
+    # search
+    search_controller.route(app)
+
+    # monitoring
+    monitoring_controller.route(app)
@@ -0,0 +1,79 @@
+import os
+import uuid
+
+import pytest
+from sqlalchemy import text, bindparam, ARRAY, Integer
+from sqlalchemy.engine import make_url
+from starlette.testclient import TestClient
+
+"""
+Tests reaching the database use the one of TEST_DATABASE_URL, never the one of .env. The application reads
+its connection from the DB_PORTGRES_* variables, so they are set here, before any test imports it; load_dotenv
+leaves variables already set alone. Replicas are turned off, reads go to the test database too. Without
+TEST_DATABASE_URL the tests needing a client are skipped.
+"""
+
+test_database_url = os.getenv("TEST_DATABASE_URL")
+if test_database_url:
+    url = make_url(test_database_url)
+    os.environ.update({"DB_PORTGRES_HOST": url.host or "localhost", "DB_PORTGRES_PORT": str(url.port or 5432),
+                       "DB_PORTGRES_USERNAME": url.username or "", "DB_PORTGRES_PASSWORD": url.password or "",
+                       "DB_PORTGRES_DBNAME": url.database or "", "DB_REPLICA_HOSTS": ""})
+
+
+@pytest.fixture(scope="module")
+def client():
+    if not test_database_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from db import migration
+    from features.user_account import registration
+    import main
+
+    migration.upgrade()
+    with pytest.MonkeyPatch.context() as patch:
+        # no confirmation mail, no face registration on activation
+        patch.setattr(registration, "confirm_registration", lambda **kwargs: None)
+        patch.setattr(registration, "register_identity_with_service", lambda **kwargs: None)
+        with TestClient(main.app) as client:
+            yield client
+
+
+@pytest.fixture(scope="module")
+def user(client):
+    """ An active user of the test module, logged in, deleted afterwards with their forms """
+    from db.database import engine
+
+    username = f"test_{uuid.uuid4().hex[:8]}"
+    response = client.post("/register", json={
+        "username": username, "password": "secret", "firstname": "Test", "lastname": "User", "gender": "male",
+        "email": f"{username}@example.com", "identity": uuid.uuid4().hex[:12], "identity_type": "cccd",
+        "images": []})
+    assert response.status_code == 201, response.text
+    with engine.connect() as connection:
+        otp = connection.execute(text("SELECT otp FROM active_user WHERE username = :username"),
+                                 {"username": username}).scalar()
+    assert client.get(f"/active_user/{username}/{otp}").status_code == 200
+    token = client.post("/login", json={"username": username, "password": "secret"}).json()["token"]
+    yield username, {"Authorization": f"Bearer {token}"}
+
+    with engine.begin() as connection:
+        form_ids = bindparam("form_ids", type_=ARRAY(Integer))
+        ids = connection.execute(text("SELECT id FROM form WHERE :username IN (created_user, assigned_user)"),
+                                 {"username": username}).scalars().all()
+        # the counters lose the deleted forms, as if they had been deleted through the application
+        connection.execute(text("""
+            UPDATE form_counter c SET count = c.count - removed.count
+            FROM (SELECT counted.scope, counted.owner, form_status::text AS form_status, count(*) AS count
+                  FROM form, LATERAL (VALUES ('created_user', created_user), ('assigned_user', assigned_user),
+                                             ('department', department), ('all', '')) AS counted (scope, owner)
+                  WHERE form.id = ANY(:form_ids)
+                  GROUP BY counted.scope, counted.owner, form_status) removed
+            WHERE c.scope = removed.scope AND c.owner = removed.owner AND c.form_status = removed.form_status
+        """).bindparams(form_ids), {"form_ids": ids})
+        connection.execute(text("DELETE FROM form_counter WHERE owner = :username"), {"username": username})
+        connection.execute(text("DELETE FROM form_detail WHERE form = ANY(:form_ids)").bindparams(form_ids),
+                           {"form_ids": ids})
+        connection.execute(text("DELETE FROM form WHERE id = ANY(:form_ids)").bindparams(form_ids), {"form_ids": ids})
+        connection.execute(text("DELETE FROM revoked_token WHERE username = :username"), {"username": username})
+        # tokens, activation, images and hierarchy links go with the user
+        connection.execute(text("DELETE FROM user_account WHERE username = :username"), {"username": username})
@@ -0,0 +1,44 @@
+import pytest
+
+"""
+Attendance report: approved forms by default, the pending ones with form_status=all, never the cancelled ones.
+"""
+
+
+@pytest.fixture(scope="module")
+def forms_by_status(client, user):
+    """ One single day form of nine productive hours per status, on days of their own """
+    username, headers = user
+    form_ids = {}
+    for day, form_status in enumerate(("pending", "approved", "cancelled"), start=1):
+        response = client.post("/form", headers=headers, json={
+            "reason": 1, "productivity": "productivity", "form_type": "leave_request",
+            "department": "IT Department", "role": "developer", "assigned_user": username,
+            "created_user": username, "details": [{"from_time": "08:00:00", "to_time": "17:00:00",
+                                                   "from_date": f"2031-01-0{day}", "to_date": f"2031-01-0{day}"}]})
+        assert response.status_code == 201, response.text
+        form_ids[form_status] = response.json()["id"]
+        if form_status != "pending":
+            response = client.put("/form/confirm", headers=headers,
+                                  data={"form_id": [form_ids[form_status]], "form_status": form_status})
+            assert response.status_code == 200, response.text
+    return form_ids
+
+
+def report_of(client, headers, username, **params) -> dict:
+    response = client.get("/reports/attendance", headers=headers, params={
+        "from_date": "2031-01-01", "to_date": "2031-01-31", "group_by": "username", "per_day": False, **params})
+    assert response.status_code == 200, response.text
+    return next(row for row in response.json() if row["key"] == username)
+
+
+def test_report_counts_approved_forms_by_default(client, user, forms_by_status):
+    username, headers = user
+    row = report_of(client, headers, username)
+    assert (row["forms"], row["hours"], row["productive_hours"]) == (1, 9, 9)
+
+
+def test_report_leaves_cancelled_forms_out_of_all(client, user, forms_by_status):
+    username, headers = user
+    row = report_of(client, headers, username, form_status="all")
+    assert (row["forms"], row["hours"], row["productive_hours"]) == (2, 18, 18)
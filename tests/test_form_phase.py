@@ -0,0 +1,16 @@
+import pytest
+
+from db import models
+from features.form.form_controller import form_phase_of
+
+""" Approval phase a form starts in, picked from the role of its creator """
+
+
+@pytest.mark.parametrize("role", ["Team Lead", "leader", "head of sales"])
+def test_leads_and_heads_go_to_the_director(role):
+    assert form_phase_of(role) == models.FormPhase.director_approved.name
+
+
+@pytest.mark.parametrize("role", ["developer", "tester"])
+def test_other_roles_go_to_the_direct_manager(role):
+    assert form_phase_of(role) == models.FormPhase.direct_manager_approved.name
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from db.database import async_engine
+
+"""
+Query count of the form reads: a page of forms, and a form, costs the same number of statements whatever the
+number of forms or details.
+"""
+
+
+@contextmanager
+def counted_statements():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+
+@pytest.fixture(scope="module")
+def form_ids(client, user):
+    username, headers = user
+    ids = []
+    for day in range(30):
+        # one more detail per form, on days of their own so they do not overlap
+        first_day = date(2030, 1, 1) + timedelta(days=day * 10)
+        details = [{"from_time": "08:00:00", "to_time": "17:00:00",
+                    "from_date": (first_day + timedelta(days=offset)).isoformat(),
+                    "to_date": (first_day + timedelta(days=offset)).isoformat()} for offset in range(day % 5 + 1)]
+        response = client.post("/form", headers=headers, json={
+            "reason": 1, "productivity": "productivity", "form_type": "leave_request",
+            "department": "IT Department", "role": "developer", "assigned_user": username,
+            "created_user": username, "details": details})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def statement_count(client, headers, path) -> int:
+    with counted_statements() as statements:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+def test_forms_page_query_count_does_not_grow_with_page_size(client, user, form_ids):
+    _, headers = user
+    # the first request caches the token, the counted ones do not validate it against the database
+    client.get("/forms/request/all", headers=headers)
+
+    small_page = statement_count(client, headers, "/forms/request/all?page_size=2")
+    large_page = statement_count(client, headers, "/forms/request/all?page_size=25")
+    assert small_page == large_page
+    assert statement_count(client, headers, "/forms/all?page_size=2") == \
+           statement_count(client, headers, "/forms/all?page_size=25")
+
+
+def test_form_query_count_does_not_grow_with_details(client, user, form_ids):
+    _, headers = user
+    client.get(f"/form/{form_ids[0]}", headers=headers)
+
+    # the first form has one detail, the fifth five
+    one_detail = statement_count(client, headers, f"/form/{form_ids[0]}")
+    five_details = statement_count(client, headers, f"/form/{form_ids[4]}")
+    assert one_detail == five_details
+    # the form with its many-to-one relationships, then its details
+    assert one_detail == 2
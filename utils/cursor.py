@@ -0,0 +1,29 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from starlette import status
+
+
+# cursor ints are INTEGER columns, anything wider would fail in the query
+max_integer = 2 ** 31
+
+
+def encode_cursor(*values) -> str:
+    """ Opaque, url-safe cursor holding the sort key of the last returned row """
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """ Values of a cursor, one of each of types in that order, 400 for anything else """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != len(types) \
+            or any(type(value) is not expected for value, expected in zip(values, types)) \
+            or any(type(value) is int and not -max_integer <= value < max_integer for value in values):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
@@ -0,0 +1,21 @@
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+class JsonSerializer:
+    """
+    Prebuilt validator and serializer of a response model. Reads ORM objects straight into JSON bytes,
+    instead of FastAPI's per request validate -> python dict -> json.dumps.
+    The route keeps response_model for the OpenAPI schema and returns serializer.response(...).
+    """
+
+    def __init__(self, response_type: Any):
+        self.adapter = TypeAdapter(response_type)
+
+    def dump(self, content: Any) -> bytes:
+        return self.adapter.dump_json(self.adapter.validate_python(content, from_attributes=True))
+
+    def response(self, content: Any, status_code: int = 200, headers: dict | None = None) -> Response:
+        return Response(self.dump(content), status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException
+from starlette import status
+
+
+class WorkerPool:
+    """
+    Runs blocking calls outside the event loop with at most max_workers of them at once.
+    Callers beyond that wait in a queue of at most max_queue, further callers are rejected with 503.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, use_processes: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+        # metrics
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        # created lazily so importing the module does not fork worker processes
+        if self._executor is None:
+            self._executor = (ProcessPoolExecutor(self.max_workers) if self.use_processes
+                              else ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name))
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Server is busy, please try again later")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.total_wait_seconds += started_at - queued_at
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run_seconds += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "executor": "process" if self.use_processes else "thread",
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.completed, 3) if self.completed else 0.0,
+            "avg_run_ms": round(self.total_run_seconds * 1000 / self.completed, 3) if self.completed else 0.0,
+        }